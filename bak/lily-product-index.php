@@ -0,0 +1,170 @@
+<?php
+/*
+Plugin Name: Lily Product Index
+Description: product_id -> post lookup table for product_Api.php, kept current when posts are saved. Install into wp-content/mu-plugins.
+*/
+
+define('LILY_PRODUCT_INDEX_VERSION', '1');
+
+function lily_product_index_table() {
+	global $wpdb;
+	return $wpdb->prefix . 'lily_products';
+}
+
+// Create the table, then backfill it from postmeta in chunks via WP-Cron so no request does the whole scan
+function lily_product_index_install() {
+	global $wpdb;
+	if (get_option('lily_product_index_version') === LILY_PRODUCT_INDEX_VERSION) {
+		return;
+	}
+
+	if (get_option('lily_product_index_table') !== LILY_PRODUCT_INDEX_VERSION) {
+		require_once(ABSPATH . 'wp-admin/includes/upgrade.php');
+		$table = lily_product_index_table();
+		dbDelta("CREATE TABLE $table (
+			product_id varchar(191) NOT NULL,
+			post_id bigint(20) unsigned NOT NULL,
+			term_ids text NOT NULL,
+			thumbnail_id bigint(20) unsigned NOT NULL DEFAULT 0,
+			structure_pic bigint(20) unsigned NOT NULL DEFAULT 0,
+			PRIMARY KEY  (product_id),
+			KEY post_id (post_id)
+		) " . $wpdb->get_charset_collate() . ";");
+
+		// Backfill starts over after a schema change
+		update_option('lily_product_index_cursor', 0, false);
+		update_option('lily_product_index_table', LILY_PRODUCT_INDEX_VERSION);
+	}
+
+	if (!wp_next_scheduled('lily_product_index_backfill')) {
+		wp_schedule_single_event(time(), 'lily_product_index_backfill');
+	}
+}
+
+// Index the next chunk of posts after the saved cursor. Returns false once the backfill is complete
+function lily_product_index_backfill($limit = 500) {
+	global $wpdb;
+	if (lily_product_index_ready() || get_option('lily_product_index_table') !== LILY_PRODUCT_INDEX_VERSION) {
+		return false;
+	}
+
+	$last = (int)get_option('lily_product_index_cursor', 0);
+	$post_ids = $wpdb->get_col($wpdb->prepare(
+		"SELECT pm.post_id FROM {$wpdb->postmeta} pm
+		 WHERE pm.meta_key = 'product_id' AND pm.post_id > %d ORDER BY pm.post_id LIMIT %d",
+		$last, $limit
+	));
+	foreach ($post_ids as $post_id) {
+		lily_product_index_refresh($post_id);
+		$last = (int)$post_id;
+	}
+
+	if (count($post_ids) < $limit) {
+		update_option('lily_product_index_version', LILY_PRODUCT_INDEX_VERSION);
+		delete_option('lily_product_index_cursor');
+		return false;
+	}
+
+	update_option('lily_product_index_cursor', $last, false);
+	return true;
+}
+
+function lily_product_index_backfill_cron() {
+	if (lily_product_index_backfill()) {
+		wp_schedule_single_event(time(), 'lily_product_index_backfill');
+	}
+}
+
+function lily_product_index_ready() {
+	return get_option('lily_product_index_version') === LILY_PRODUCT_INDEX_VERSION;
+}
+
+// Rewrite the row of one post, or drop it when the post no longer counts as a product
+function lily_product_index_refresh($post_id) {
+	global $wpdb;
+	$table = lily_product_index_table();
+	$post = get_post($post_id);
+	$product_id = $post ? (string)get_post_meta($post_id, 'product_id', true) : '';
+
+	if (!$post || $post->post_type != 'post' || in_array($post->post_status, array('trash', 'auto-draft')) || $product_id === '') {
+		$wpdb->delete($table, array('post_id' => (int)$post_id));
+		return;
+	}
+
+	// The product_id meta may have changed
+	$wpdb->query($wpdb->prepare("DELETE FROM $table WHERE post_id = %d AND product_id <> %s", $post_id, $product_id));
+
+	// Keep the oldest post when a product_id was posted twice
+	$owner = $wpdb->get_var($wpdb->prepare("SELECT post_id FROM $table WHERE product_id = %s", $product_id));
+	if ($owner && (int)$owner < (int)$post_id && get_post_status($owner) && get_post_status($owner) != 'trash') {
+		return;
+	}
+
+	$wpdb->replace($table, array(
+		'product_id' => $product_id,
+		'post_id' => (int)$post_id,
+		'term_ids' => implode(',', wp_get_post_categories($post_id)),
+		'thumbnail_id' => (int)get_post_meta($post_id, '_thumbnail_id', true),
+		'structure_pic' => (int)get_post_meta($post_id, 'structure_pic', true),
+	));
+}
+
+function lily_product_index_meta_changed($meta_id, $post_id, $meta_key) {
+	if (in_array($meta_key, array('product_id', '_thumbnail_id', 'structure_pic'))) {
+		lily_product_index_refresh($post_id);
+	}
+}
+
+function lily_product_index_terms_changed($post_id, $terms, $tt_ids, $taxonomy) {
+	if ($taxonomy == 'category') {
+		lily_product_index_refresh($post_id);
+	}
+}
+
+function lily_product_index_status_changed($new_status, $old_status, $post) {
+	if ($new_status != $old_status) {
+		lily_product_index_refresh($post->ID);
+	}
+}
+
+function lily_product_index_deleted($post_id) {
+	global $wpdb;
+	$wpdb->delete(lily_product_index_table(), array('post_id' => (int)$post_id));
+}
+
+// Rows as returned by product_Api.php, keyed by product_id
+function lily_product_index_rows($rows) {
+	$found = array();
+	foreach ($rows as $row) {
+		$categories = array();
+		foreach (array_filter(explode(',', $row->term_ids), 'strlen') as $term_id) {
+			$categories[] = array('term_id' => (int)$term_id);
+		}
+		$found[$row->product_id] = array(
+			'article_id' => (int)$row->post_id,
+			'categories' => $categories,
+			'media_ids' => array((int)$row->thumbnail_id, (int)$row->structure_pic),
+		);
+	}
+	return $found;
+}
+
+add_action('init', 'lily_product_index_install');
+add_action('lily_product_index_backfill', 'lily_product_index_backfill_cron');
+add_action('added_post_meta', 'lily_product_index_meta_changed', 10, 3);
+add_action('updated_post_meta', 'lily_product_index_meta_changed', 10, 3);
+add_action('deleted_post_meta', 'lily_product_index_meta_changed', 10, 3);
+add_action('set_object_terms', 'lily_product_index_terms_changed', 10, 4);
+add_action('transition_post_status', 'lily_product_index_status_changed', 10, 3);
+add_action('deleted_post', 'lily_product_index_deleted');
+
+// wp lily-product-index backfill: finish the backfill now instead of waiting for WP-Cron
+if (defined('WP_CLI') && WP_CLI) {
+	WP_CLI::add_command('lily-product-index backfill', function () {
+		lily_product_index_install();
+		while (lily_product_index_backfill()) {
+			WP_CLI::log('Indexed up to post ' . get_option('lily_product_index_cursor'));
+		}
+		WP_CLI::success('lily_products index is ready');
+	});
+}
@@ -2,31 +2,174 @@
 require_once(dirname(__FILE__).'/wp-load.php');
 header('Content-Type:text/json;charset=utf-8');
 
+// Indexed lookups through the lily_products table (mu-plugins/lily-product-index.php), when installed
+$indexed = function_exists('lily_product_index_ready') && lily_product_index_ready();
+
+// List mode: list=1&page=N&per_page=M, dumps every product for the local index
+if (!empty($_REQUEST["list"])) {
+	global $wpdb;
+	$page = max(1, (int)$_REQUEST["page"]);
+	$per_page = min(5000, max(1, isset($_REQUEST["per_page"]) ? (int)$_REQUEST["per_page"] : 1000));
+
+	if ($indexed) {
+		$table = lily_product_index_table();
+		$rows = $wpdb->get_results($wpdb->prepare(
+			"SELECT * FROM $table ORDER BY post_id LIMIT %d OFFSET %d",
+			$per_page + 1, ($page - 1) * $per_page
+		));
+		$more = count($rows) > $per_page;
+		$found = lily_product_index_rows(array_slice($rows, 0, $per_page));
+
+		echo json_encode(array(
+			'exist'=>empty($found) ? false : (object)$found,
+			'more'=>$more,
+		));
+		exit;
+	}
+
+	$rows = $wpdb->get_results($wpdb->prepare(
+		"SELECT pm.post_id, pm.meta_value FROM {$wpdb->postmeta} pm
+		 INNER JOIN {$wpdb->posts} p ON p.ID = pm.post_id
+		 WHERE pm.meta_key = 'product_id' AND p.post_type = 'post' AND p.post_status NOT IN ('trash', 'auto-draft')
+		 ORDER BY pm.post_id LIMIT %d OFFSET %d",
+		$per_page + 1, ($page - 1) * $per_page
+	));
+
+	$more = count($rows) > $per_page;
+	$rows = array_slice($rows, 0, $per_page);
+
+	$found = array();
+	$post_ids = array();
+	foreach ($rows as $row) {
+		$found[$row->meta_value] = array(
+			'article_id'=>(int)$row->post_id,
+			'categories'=>array(),
+			'media_ids'=>array(
+				(int)get_post_meta($row->post_id, '_thumbnail_id', true),
+				(int)get_post_meta($row->post_id, 'structure_pic', true),
+			),
+		);
+		$post_ids[(int)$row->post_id] = $row->meta_value;
+	}
+
+	if (!empty($post_ids)) {
+		$terms = wp_get_object_terms(array_keys($post_ids), 'category', array('fields' => 'all_with_object_id'));
+		foreach ($terms as $term) {
+			$found[$post_ids[$term->object_id]]['categories'][] = array('term_id'=>$term->term_id);
+		}
+	}
+
+	echo json_encode(array(
+		'exist'=>empty($found) ? false : (object)$found,
+		'more'=>$more,
+	));
+	exit;
+}
+
+// Batch mode: product_ids=a,b,c (GET or POST), returns exist as {product_id: {...}}
+$product_ids = isset($_REQUEST["product_ids"]) ? $_REQUEST["product_ids"] : '';
+if (!empty($product_ids)) {
+	$product_ids = array_values(array_unique(array_filter(array_map('trim', explode(',', $product_ids)), 'strlen')));
+
+	global $wpdb;
+	$placeholders = implode(',', array_fill(0, count($product_ids), '%s'));
+
+	if ($indexed) {
+		// Primary key lookup, no postmeta scan
+		$table = lily_product_index_table();
+		$found = lily_product_index_rows($wpdb->get_results($wpdb->prepare(
+			"SELECT * FROM $table WHERE product_id IN ($placeholders)",
+			$product_ids
+		)));
+
+		echo json_encode(array(
+			'exist'=>empty($found) ? false : (object)$found,
+		));
+		exit;
+	}
+
+	// One meta query for the whole batch
+	$rows = $wpdb->get_results($wpdb->prepare(
+		"SELECT pm.post_id, pm.meta_value FROM {$wpdb->postmeta} pm
+		 INNER JOIN {$wpdb->posts} p ON p.ID = pm.post_id
+		 WHERE pm.meta_key = 'product_id' AND pm.meta_value IN ($placeholders)
+		 AND p.post_type = 'post' AND p.post_status NOT IN ('trash', 'auto-draft')",
+		$product_ids
+	));
+
+	$found = array();
+	$post_ids = array();
+	foreach ($rows as $row) {
+		$found[$row->meta_value] = array(
+			'article_id'=>(int)$row->post_id,
+			'categories'=>array(),
+		);
+		$post_ids[(int)$row->post_id] = $row->meta_value;
+	}
+
+	// One term query for all found posts
+	if (!empty($post_ids)) {
+		$terms = wp_get_object_terms(array_keys($post_ids), 'category', array('fields' => 'all_with_object_id'));
+		foreach ($terms as $term) {
+			$key = $post_ids[$term->object_id];
+			if ($found[$key]['article_id'] == $term->object_id) {
+				$found[$key]['categories'][] = array('term_id'=>$term->term_id);
+			}
+		}
+	}
+
+	$str = array(
+		'exist'=>empty($found) ? false : (object)$found,
+	);
+	echo json_encode($str);
+	exit;
+}
+
 $product_id = $_GET["product_id"];
 if (empty($product_id)) {
 	exit('Param is empty');
 }
 
-// Find post_id by search VideoGuid
+if ($indexed) {
+	global $wpdb;
+	$table = lily_product_index_table();
+	$found = lily_product_index_rows($wpdb->get_results($wpdb->prepare(
+		"SELECT * FROM $table WHERE product_id = %s LIMIT 1",
+		$product_id
+	)));
+
+	echo json_encode(array(
+		'exist'=>empty($found) ? false : reset($found),
+	));
+	exit;
+}
+
+// Find post_id by search VideoGuid, ids only and stop at the first hit
 $args = array(
 'post_type'=>'post',
 'post_status' => 'any',
 'meta_key' => 'product_id',
 'meta_value' => $product_id,
+'fields' => 'ids',
+'posts_per_page' => 1,
+'no_found_rows' => true,
+'update_post_meta_cache' => false,
+'update_post_term_cache' => false,
 );
 
-$wp_query=new WP_Query($args);
-if ( $wp_query->have_posts() ) :
+$post_ids = get_posts($args);
+if ( !empty($post_ids) ) :
 	# Id already exist
-    while ( $wp_query->have_posts() ) {
-        $wp_query->the_post();
-			$str = array(
-				'exist'=>array(
-							'article_id'=>get_the_id(),
-							'categories'=>get_the_category(),
-						),
-			);
-    }
+	$categories = array();
+	foreach (wp_get_post_categories($post_ids[0]) as $term_id) {
+		$categories[] = array('term_id'=>$term_id);
+	}
+	$str = array(
+		'exist'=>array(
+					'article_id'=>$post_ids[0],
+					'categories'=>$categories,
+				),
+	);
 else: 
 	$str = array(
         'exist'=>false,
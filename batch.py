@@ -0,0 +1,69 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+from lxml import etree
+
+
+def load_links(source, scrape_obj=None):
+    """
+    读取分类 url 列表，source 可以是：
+    每行一个 url 的文本文件、sitemap.xml 文件，或者 sitemap 的 url
+    """
+    if source.startswith('http://') or source.startswith('https://'):
+        r = scrape_obj.fetch(source, 30, revalidate=True)
+        if r.status_code != 200:
+            raise Exception(f"Fetch {source} failed, {r.status_code}")
+        content = r.content
+    else:
+        with open(source, 'rb') as f:
+            content = f.read()
+
+    if content.lstrip().startswith(b'<'):
+        return parse_sitemap(content, scrape_obj)
+
+    links = []
+    for line in content.decode('utf-8').splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            links.append(line)
+    return list(dict.fromkeys(links))
+
+
+def parse_sitemap(content, scrape_obj=None):
+    """解析 sitemap，sitemap index 会继续读取子 sitemap"""
+    root = etree.fromstring(content)
+    locs = [loc.text.strip() for loc in root.iter('{*}loc') if loc.text]
+
+    if etree.QName(root).localname == 'sitemapindex':
+        links = []
+        for loc in locs:
+            links.extend(load_links(loc, scrape_obj))
+        return list(dict.fromkeys(links))
+
+    return list(dict.fromkeys(locs))
+
+
+def run_batch(scrape_obj, links, concurrency=2):
+    """
+    多个分类共用一个 Scrape 的连接池、限速、缓存和线程池，
+    同时抓取 concurrency 个分类页，产品任务在共享线程池里轮流执行
+    """
+    started = time.monotonic()
+    logger.info(f'Batch: {len(links)} categories')
+
+    def run_one(link):
+        try:
+            scrape_obj.spawn(link).run()
+        except Exception as e:
+            logger.error(f'Category {link} failed: {e}')
+
+    with ThreadPoolExecutor(max_workers=max(int(concurrency), 1)) as pool:
+        list(pool.map(run_one, links))
+
+    if scrape_obj.scheduler:
+        logger.info(f'Batch finished\n{scrape_obj.scheduler.report()}')
+    else:
+        logger.info(f'Batch finished: {len(links)} categories in {time.monotonic() - started:.1f}s')
+
+    scrape_obj.report()
@@ -0,0 +1,188 @@
+import collections
+import json
+import threading
+
+import requests
+from loguru import logger
+
+import retry_policy
+from metrics import METRICS
+
+# WordPress /batch/v1 默认一次最多 25 个请求
+MAX_ITEMS = 25
+
+Item = collections.namedtuple('Item', 'stage path body done idempotent key')
+
+
+class BatchWriter:
+    """
+    把创建、更新文章的请求攒起来，通过 /wp-json/batch/v1 一次发送，
+    每个请求的结果按顺序交给它的 done(status, body) 回调；
+    单个请求失败或者服务器不支持 batch 时，退回单独发送 single(stage, path, body, idempotent)
+    """
+
+    def __init__(self, api_root, http, policy, host_limiter, single, max_items=MAX_ITEMS, interval=1.0):
+        self.url = api_root + '/batch/v1'
+        self.http = http
+        self.policy = policy
+        self.host_limiter = host_limiter
+        self.single = single
+        if max_items > MAX_ITEMS:
+            logger.warning(f'Batch size {max_items} is over the WordPress limit, use {MAX_ITEMS}')
+        self.max_items = min(max_items, MAX_ITEMS)
+        self.interval = interval
+        self.supported = True
+
+        self.items = []
+        self.sending = 0
+        self.cond = threading.Condition()
+        self.stopped = False
+        self.thread = threading.Thread(target=self.loop, name='batch-writer', daemon=True)
+        self.thread.start()
+
+    def add(self, stage, path, body, done, idempotent=True, key=None):
+        with self.cond:
+            self.items.append(Item(stage, path, body, done, idempotent, key))
+            if len(self.items) >= self.max_items:
+                self.cond.notify_all()
+
+    def take(self):
+        """调用方持有 self.cond"""
+        items, self.items = self.items[:self.max_items], self.items[self.max_items:]
+        self.sending += 1
+        return items
+
+    def loop(self):
+        while True:
+            with self.cond:
+                if not self.stopped and len(self.items) < self.max_items:
+                    self.cond.wait(self.interval)
+                if self.stopped and not self.items:
+                    return
+                items = self.take() if self.items else None
+
+            if items:
+                self.run(items)
+
+    def run(self, items):
+        try:
+            self.send(items)
+        finally:
+            with self.cond:
+                self.sending -= 1
+                self.cond.notify_all()
+
+    def flush(self):
+        """发送缓冲区里的全部请求，并等待正在发送的批次完成"""
+        while True:
+            with self.cond:
+                if self.items:
+                    items = self.take()
+                elif self.sending:
+                    self.cond.wait()
+                    continue
+                else:
+                    return
+
+            self.run(items)
+
+    def idle(self):
+        """缓冲区为空且没有正在发送的批次"""
+        with self.cond:
+            return not self.items and not self.sending
+
+    def stop(self):
+        self.flush()
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        self.thread.join()
+
+    def send(self, items):
+        if not self.supported or len(items) == 1:
+            return self.fallback(items, count=False)
+
+        payload = {
+            'validation': 'normal',
+            'requests': [{'method': 'POST', 'path': item.path, 'body': item.body} for item in items],
+        }
+        # 里面有创建文章的请求时，整批不是幂等的
+        idempotent = all(item.idempotent for item in items)
+
+        def post():
+            with self.host_limiter.slot(self.url):
+                return self.http.post(self.url, data=json.dumps(payload),
+                                      headers={'content-type': 'application/json'})
+
+        try:
+            r = self.policy.call('batch', self.url, post, idempotent=idempotent)
+        except (requests.exceptions.RequestException, retry_policy.CircuitOpenError) as e:
+            logger.error(f'Batch of {len(items)} failed: {e}')
+            return self.failed(items)
+
+        if r.status_code in (404, 405):
+            # WordPress 5.6 之前没有 batch 接口
+            logger.warning(f'Batch endpoint not available ({r.status_code}), send one by one')
+            self.supported = False
+            return self.fallback(items)
+
+        if r.status_code in retry_policy.SAFE_STATUS:
+            # 服务器没有处理这一批
+            return self.fallback(items)
+
+        if r.status_code == 400:
+            # 超过服务器的 maxItems（站点可以用 rest_get_max_batch_size 改小）时整批被拒绝，一个都没有处理，拆开重发
+            half = len(items) // 2
+            with self.cond:
+                self.max_items = min(self.max_items, half)
+            logger.warning(f'Batch of {len(items)} rejected ({r.status_code}), send in batches of {half}')
+            METRICS.count('batch_split')
+            self.send(items[:half])
+            return self.send(items[half:])
+
+        if r.status_code not in (200, 207):
+            logger.error(f'Batch of {len(items)} failed: {r.status_code}')
+            return self.failed(items)
+
+        METRICS.count('batch_requests')
+        METRICS.count('batch_items', len(items))
+
+        responses = r.json().get('responses') or []
+        retry = []
+        for i, item in enumerate(items):
+            resp = responses[i] if i < len(responses) else None
+            status = resp.get('status', 0) if resp else 0
+            if not resp or status in retry_policy.RETRY_STATUS:
+                retry.append(item)
+                continue
+            self.finish(item, status, resp.get('body'))
+
+        if retry:
+            logger.warning(f'{len(retry)} items of batch failed, send one by one')
+            self.fallback(retry)
+
+    def failed(self, items):
+        """整批失败：更新请求单独重发；创建请求可能已经生效，不再重发，报告失败"""
+        self.fallback([item for item in items if item.idempotent])
+        for item in items:
+            if not item.idempotent:
+                logger.error(f'Batch {item.stage} {item.key} failed, not retried')
+                self.finish(item, 0, None)
+
+    def fallback(self, items, count=True):
+        for item in items:
+            if count:
+                METRICS.count('batch_fallback')
+            try:
+                status, body = self.single(item.stage, item.path, item.body, item.idempotent)
+            except Exception as e:
+                logger.error(f'{item.stage} {item.key} failed: {e}')
+                status, body = 0, None
+            self.finish(item, status, body)
+
+    @staticmethod
+    def finish(item, status, body):
+        try:
+            item.done(status, body or {})
+        except Exception as e:
+            logger.error(f'Batch callback of {item.key} failed: {e}')
@@ -0,0 +1,175 @@
+"""
+离线端到端测速：起本地假 lily-bearing 站点和假 WordPress，跑 Scrape.run，
+再对 extract_product / modify_table / get_size 做微基准
+
+python bench/bench_scrape.py --categories 2 --per-group 30 --workers 8 --latency 0.02
+python bench/bench_scrape.py --micro-only
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import timeit
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from loguru import logger
+
+import batch
+import metrics
+from category_cache import CategoryCache
+from checkpoint import Checkpoint
+from media_cache import MediaCache
+from page_cache import PageCache
+from product_index import ProductIndex
+from discovery import Discovery
+from image_optimizer import ImageOptimizer
+from export import Exporter
+from scrape import Scrape
+from fake_servers import FakeSite, FakeWordPress, PAGES_DIR
+
+
+def build_scrape(args, site, wp, data_dir, link='', run=0, sitemap=None):
+    return Scrape(link,
+                  workers=args.workers,
+                  per_host=args.per_host,
+                  rate=args.rate,
+                  pool_size=args.pool_size,
+                  parser=args.parser,
+                  index=ProductIndex(os.path.join(data_dir, 'products.db')) if not args.no_cache else None,
+                  categories=CategoryCache(os.path.join(data_dir, 'categories.json') if not args.no_cache else None),
+                  media=MediaCache(os.path.join(data_dir, 'media.db')) if not args.no_cache else None,
+                  journal=Checkpoint(os.path.join(data_dir, 'checkpoint.db')),
+                  root=site.url + '/',
+                  wp_domain=wp.url,
+                  sync=args.sync,
+                  batch_size=args.batch_size,
+                  exporter=Exporter(os.path.join(data_dir, f'export-{run}.{args.export}'),
+                                    args.export) if args.export else None,
+                  media_queue=args.media_queue,
+                  media_draft=args.media_draft,
+                  optimizer=ImageOptimizer(args.optimize_images,
+                                           workers=args.image_workers) if args.optimize_images else None,
+                  discovery=Discovery(os.path.join(data_dir, 'discovery.db'),
+                                      sitemap=sitemap if args.sitemap else None) if args.incremental else None,
+                  pages=PageCache(os.path.join(data_dir, 'pages.db'), ttl=args.page_ttl,
+                                  offline=args.offline and run > 0) if not args.no_cache else None)
+
+
+def end_to_end(args):
+    site = FakeSite(groups=args.groups, per_group=args.per_group, shared_images=args.shared_images,
+                    change_rate=args.change_rate,
+                    real_images=tuple(map(int, args.real_images.split('x'))) if args.real_images else None,
+                    latency=args.latency, error_rate=args.error_rate).start()
+    wp = FakeWordPress(latency=args.wp_latency, error_rate=args.error_rate).start()
+    links = [f'{site.url}/cat{i}/' for i in range(args.categories)]
+    total = args.categories * args.groups * args.per_group
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        for run in range(args.runs):
+            metrics.METRICS.reset()
+            site.revision = run
+            site_requests, wp_requests, wp_writes = site.requests, wp.requests, wp.writes
+
+            sitemap = f'{site.url}/sitemap.xml?categories={",".join(f"cat{i}" for i in range(args.categories))}'
+            scrape_obj = build_scrape(args, site, wp, data_dir, run=run, sitemap=sitemap)
+            if scrape_obj.discovery:
+                scrape_obj.discovery.refresh(scrape_obj)
+            scrape_obj.report_metrics = False
+            start = time.perf_counter()
+            if len(links) > 1:
+                batch.run_batch(scrape_obj, links, args.category_concurrency)
+            else:
+                scrape_obj.spawn(links[0]).run()
+            elapsed = time.perf_counter() - start
+            if scrape_obj.scheduler:
+                scrape_obj.scheduler.close()
+            if scrape_obj.export:
+                scrape_obj.export.close()
+                print(f'\nexport {scrape_obj.export.path}: {os.path.getsize(scrape_obj.export.path) / 1024:.1f} KB')
+            elif scrape_obj.wp_cls.optimizer:
+                scrape_obj.wp_cls.optimizer.close()
+
+            print(f'\nrun {run + 1}: {total} products in {elapsed:.2f}s = {total / elapsed:.1f} products/s, '
+                  f'site requests {site.requests - site_requests}, wp requests {wp.requests - wp_requests}, '
+                  f'wp writes {wp.writes - wp_writes}, posts {len(wp.posts)}, media {len(wp.media)}, '
+                  f'posts with both pictures {sum(1 for p in wp.posts.values() if p["featured_media"] and p["meta"].get("structure_pic"))}, '
+                  f'drafts {sum(1 for p in wp.posts.values() if p.get("status") == "draft")}')
+            print(metrics.METRICS.summary())
+
+    site.stop()
+    wp.stop()
+
+
+def micro(args):
+    with open(os.path.join(PAGES_DIR, 'product.html'), 'rb') as f:
+        content = f.read()
+
+    scrape_obj = Scrape('', parser=args.parser)
+    scrape_obj.wp_cls.post_article = lambda **kwargs: None
+    r = types.SimpleNamespace(content=content)
+    page = scrape_obj.parser.parse_product(content)
+    table_rows = page['table'].rows
+
+    def fresh_table():
+        return type(page['table'])([list(row) for row in table_rows])
+
+    cases = {
+        'extract_product': lambda: scrape_obj.extract_product({1}, 'Deep Groove Ball Bearings', r),
+        'modify_table': lambda: scrape_obj.modify_table(fresh_table()),
+        'get_size': lambda: scrape_obj.get_size(fresh_table()),
+        'copy table (baseline)': fresh_table,
+    }
+
+    print(f'\nmicro benchmarks ({args.parser} parser, {args.number} loops)')
+    for name, fn in cases.items():
+        t = timeit.timeit(fn, number=args.number) / args.number
+        print(f'{name:<24}{t * 1e6:>10.1f} us')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--categories', type=int, default=1)
+    parser.add_argument('--category-concurrency', type=int, default=2)
+    parser.add_argument('--groups', type=int, default=3)
+    parser.add_argument('--per-group', type=int, default=20)
+    parser.add_argument('--shared-images', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--per-host', type=int, default=8)
+    parser.add_argument('--pool-size', type=int, default=16)
+    parser.add_argument('--rate', type=float, default=0, help='0 = no rate limit')
+    parser.add_argument('--parser', default='lxml')
+    parser.add_argument('--latency', type=float, default=0.01, help='fake site latency per request (s)')
+    parser.add_argument('--wp-latency', type=float, default=0.03, help='fake WordPress latency per request (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--runs', type=int, default=2, help='later runs reuse the caches of the first')
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--batch-size', type=int, default=25, help='0 = one WordPress request per post write')
+    parser.add_argument('--sync', action='store_true', help='incremental sync of existing products')
+    parser.add_argument('--page-ttl', type=float, default=0, help='seconds, 0 = always revalidate cached pages')
+    parser.add_argument('--offline', action='store_true', help='later runs read pages only from the page cache')
+    parser.add_argument('--incremental', action='store_true', help='only process new or changed products')
+    parser.add_argument('--sitemap', action='store_true', help='with --incremental, use the fake sitemap lastmod')
+    parser.add_argument('--real-images', default='', help='WxH, serve decodable PNG images of this size')
+    parser.add_argument('--optimize-images', default='', choices=['', 'webp', 'jpeg'])
+    parser.add_argument('--image-workers', type=int, default=2)
+    parser.add_argument('--export', default='', choices=['', 'wxr', 'csv'], help='write an import file instead of REST calls')
+    parser.add_argument('--media-queue', type=int, default=0, help='publish first, upload images with N threads')
+    parser.add_argument('--media-draft', action='store_true')
+    parser.add_argument('--change-rate', type=float, default=0.0, help='share of products whose price changes each run')
+    parser.add_argument('--number', type=int, default=500)
+    parser.add_argument('--micro-only', action='store_true')
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level='ERROR')
+
+    if not args.micro_only:
+        end_to_end(args)
+    micro(args)
+
+
+if __name__ == '__main__':
+    main()
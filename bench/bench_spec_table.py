@@ -0,0 +1,168 @@
+"""
+SpecTable 与原 pandas 实现的对比：检查输出完全一致，并比较耗时，
+另外检查布尔值、inf、小数、全角数字等特殊单元格的类型推断和输出格式与 pandas 一致
+
+python bench/bench_spec_table.py [page.html ...] [--number 200]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lxml import etree
+
+import page_parser
+import spec_table
+import scrape
+from scrape import Scrape
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+TABLE_XPATH = "//div[contains(concat(' ', normalize-space(@class), ' '), ' layui-row ')]" \
+              "/div[contains(concat(' ', normalize-space(@class), ' '), ' layui-col-md4 ')]" \
+              "/div[contains(concat(' ', normalize-space(@class), ' '), ' layui-col-md9 ')]/table"
+
+# 第二列的单元格文字，覆盖 convert_column 和 pandas 推断类型不同的情况
+EDGE_COLUMNS = [
+    ['True', 'False'], ['true', 'FALSE'], ['tRuE', 'false'], ['True', ''], ['True', '1'],
+    ['inf', '1'], ['-inf', '2.5'], ['+Infinity', '1'], ['iNf', '3'], ['1', 'inf', ''], ['inf', 'x'], ['infx', '1'],
+    ['nan', '1'], ['1e3', '2'], ['1,000', '2'], ['1', ''],
+]
+
+# 三列的表，第二、三列的单元格文字：float 列整列统一格式、科学计数法、全角数字，
+# 最后一个超过 12 行，拆成 table1/table2 后每段单独格式
+EDGE_TABLES = [
+    (['1.5', '3', '4'], ['x', 'y', 'z']),
+    (['1.25', '3'], ['1', '1.000001']),
+    (['1e-7', '2'], ['1', '2']),
+    (['1e16', '2'], ['0.1234567', '12345.5']),
+    (['1e7', '2.5'], ['', '-0.0']),
+    (['１２', '３'], ['１.5', '3']),
+    (['inf', '12345678.5'], ['', '2.5']),
+    ([str(i * 0.25) for i in range(14)] + ['1e-7', '3'], [str(i) for i in range(15)] + ['4.5']),
+]
+
+# 行的形状：空行（pandas 补成一行 NaN）、colspan
+EDGE_HTML = [
+    '<table><tr><td>a</td><td>1</td></tr><tr><td></td></tr><tr></tr><tr><td>b</td><td>x</td></tr></table>',
+    '<table><tr><td>a</td><td colspan="2">1.5</td></tr><tr><td>b</td><td>2</td><td></td></tr></table>',
+]
+
+
+def pandas_path(table_html, scrape_obj):
+    """原来的实现：pandas.read_html + DataFrame 查找/修改"""
+    import pandas
+
+    table = pandas.read_html(io.StringIO(table_html), thousands="ª", decimal="ª")[0]
+
+    size = ''
+    for keys in scrape.SIZE_KEYS:
+        try:
+            values = []
+            for key in keys:
+                hit = table[table[0] == key].index
+                values.append(table.loc[hit[0], 1])
+            size = '×'.join(values)
+            break
+        except:
+            pass
+
+    table.drop(table.tail(1).index, inplace=True)
+    table.loc[0, 0] = 'Bearing Model'
+    table.loc[0, 1] = f'{table.iat[0, 1]} Bearing'
+
+    for old, new in scrape.TABLE_CHANGES:
+        try:
+            i = table[table[0] == old].index
+            table.loc[i[0], 0] = new
+        except:
+            pass
+
+    split_num = 12
+    table1 = table.head(split_num).to_html(classes='table1', header=False, index=False).replace('border="1" ', '')
+    table2 = table.tail(len(table) - split_num).to_html(classes='table2', header=False, index=False).replace('border="1" ', '')
+
+    return size, table1, table2
+
+
+def spec_table_path(table_html, scrape_obj):
+    table = spec_table.SpecTable.from_html(table_html)
+    size = scrape_obj.get_size(table)
+    table1, table2 = scrape_obj.modify_table(table)
+    return size, table1, table2
+
+
+def edge_table(*columns):
+    """第一列是 key，其余列按给出的文字，列短的地方是空单元格"""
+    rows = []
+    for i in range(max(len(c) for c in columns)):
+        cells = ''.join(f'<td>{c[i] if i < len(c) else ""}</td>' for c in columns)
+        rows.append(f'<tr><td>key{i}</td>{cells}</tr>')
+    return f'<table>{"".join(rows)}</table>'
+
+
+def check_edge_cases(scrape_obj):
+    """
+    特殊单元格：pandas 和 SpecTable 直接输出的 html，以及经过 modify_table 拆分后的 html 都要完全一致，
+    返回不一致的个数
+    """
+    import pandas
+
+    cases = [edge_table(column) for column in EDGE_COLUMNS] + [edge_table(*columns) for columns in EDGE_TABLES] \
+        + EDGE_HTML
+    failed = 0
+    for table_html in cases:
+        expected = pandas.read_html(io.StringIO(table_html), thousands="ª", decimal="ª")[0] \
+            .to_html(classes='table1', header=False, index=False).replace('border="1" ', '')
+        actual = spec_table.SpecTable.from_html(table_html).to_html('table1')
+        same = expected == actual and pandas_path(table_html, scrape_obj) == spec_table_path(table_html, scrape_obj)
+        if not same:
+            failed += 1
+            print(f'edge case {table_html}: identical=False\n--- pandas\n{expected}\n+++ spec_table\n{actual}')
+
+    print(f'edge cases: {len(cases) - failed}/{len(cases)} identical')
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('pages', nargs='*')
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+
+    pages = args.pages or [os.path.join(PAGES_DIR, f) for f in sorted(os.listdir(PAGES_DIR)) if f.startswith('product')]
+    scrape_obj = Scrape('')
+
+    t = time.perf_counter()
+    import pandas  # noqa: F401
+    print(f'import pandas: {(time.perf_counter() - t) * 1000:.1f} ms')
+
+    failed = check_edge_cases(scrape_obj)
+    for page in pages:
+        with open(page, 'rb') as f:
+            doc = page_parser.LxmlParser.document(f.read())
+        table_html = etree.tostring(doc.xpath(TABLE_XPATH)[0], encoding='unicode', method='html')
+
+        expected = pandas_path(table_html, scrape_obj)
+        actual = spec_table_path(table_html, scrape_obj)
+        same = expected == actual
+        failed += not same
+
+        old = timeit.timeit(lambda: pandas_path(table_html, scrape_obj), number=args.number) / args.number
+        new = timeit.timeit(lambda: spec_table_path(table_html, scrape_obj), number=args.number) / args.number
+        print(f'{os.path.basename(page)}: identical={same} pandas={old * 1e6:.0f} us '
+              f'spec_table={new * 1e6:.0f} us speedup={old / new:.1f}x')
+
+        if not same:
+            for name, a, b in zip(('size', 'table1', 'table2'), expected, actual):
+                if a != b:
+                    print(f'--- {name} (pandas)\n{a}\n+++ {name} (spec_table)\n{b}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
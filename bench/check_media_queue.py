@@ -0,0 +1,73 @@
+"""
+检查 --media-queue 在批量写入下的顺序：Api.flush 返回时每篇文章都已经补上两张图片并发布，
+图片上传成功但补到文章上失败时，下一轮要重新补上
+
+python bench/check_media_queue.py [--products 5] [--batch-size 100]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from loguru import logger
+
+from scrape import Scrape
+from fake_servers import FakeSite, FakeWordPress
+
+
+def fail_first_attach(wp):
+    """每篇文章第一次补图片的更新返回 400"""
+    posts_api = wp.posts_api
+    failed = set()
+
+    def patched(api, payload):
+        if api != 'posts' and api not in failed and ('featured_media' in payload or 'metadata' in payload):
+            failed.add(api)
+            return 400, {'code': 'fake_error'}
+        return posts_api(api, payload)
+
+    wp.posts_api = patched
+
+
+def check(products, batch_size, draft, fail_attach=False):
+    site = FakeSite(groups=1, per_group=products).start()
+    wp = FakeWordPress().start()
+    if fail_attach:
+        fail_first_attach(wp)
+    try:
+        scrape_obj = Scrape('', rate=0, media_queue=2, media_draft=draft, batch_size=batch_size,
+                            root=site.url + '/', wp_domain=wp.url)
+        scrape_obj.report_metrics = False
+        scrape_obj.policy.base_delay = 0.01
+        scrape_obj.spawn(f'{site.url}/cat0/').run()
+
+        # run 返回时就要全部完成，进程随后退出，后台线程来不及再发送
+        api = scrape_obj.wp_cls
+        idle = not api.media_queue.pending and not (api.writer and (api.writer.items or api.writer.sending))
+        posts = [dict(p, meta=dict(p['meta'])) for p in wp.posts.values()]
+        missing = [p['title'] for p in posts if not p['featured_media'] or not p['meta'].get('structure_pic')]
+        drafts = [p['title'] for p in posts if p.get('status') == 'draft']
+        ok = idle and len(posts) == products and not missing and not drafts
+        print(f'batch_size={batch_size} draft={draft} fail_attach={fail_attach}: {len(posts)} posts, {len(missing)} without pictures, '
+              f'{len(drafts)} drafts, idle {idle} -> {"OK" if ok else "FAIL"}')
+        return ok
+    finally:
+        site.stop()
+        wp.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+
+    logger.remove()
+    results = [check(args.products, batch_size, draft, fail_attach)
+               for batch_size in (0, args.batch_size) for draft in (False, True) for fail_attach in (False, True)]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,469 @@
+"""
+本地假站点，用来离线测速：
+FakeSite      仿 lily-bearing.com 的分类页、产品页和图片
+FakeWordPress 仿 /wp-json/wp/v2/posts、/categories、/media 和 product_Api.php
+ProductApiServer 用 SQLite 仿 WordPress 数据库，对比 product_Api.php 两种查询方式
+
+两者都可以配置每个请求的延迟和出错（HTTP 500）概率
+"""
+import hashlib
+import html
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import struct
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+
+
+class FakeServer:
+    """在后台线程里跑一个 ThreadingHTTPServer"""
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # 头和正文一起发出，避免 Nagle + 延迟 ACK 给每个请求多加 40ms
+            disable_nagle_algorithm = True
+            wbufsize = 64 * 1024
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.dispatch(self, 'GET')
+
+            def do_POST(self):
+                server.dispatch(self, 'POST')
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def dispatch(self, handler, method):
+        with self.lock:
+            self.requests += 1
+            fail = self.random.random() < self.error_rate
+
+        length = int(handler.headers.get('content-length') or 0)
+        body = handler.rfile.read(length) if length else b''
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if fail:
+            return self.send(handler, 500, b'{"code":"fake_error"}')
+
+        parts = urllib.parse.urlsplit(handler.path)
+        query = dict(urllib.parse.parse_qsl(parts.query))
+        self.handle(handler, method, parts.path, query, body)
+
+    @staticmethod
+    def send(handler, status, body, content_type='application/json', headers=None):
+        handler.send_response(status)
+        handler.send_header('content-type', content_type)
+        handler.send_header('content-length', str(len(body)))
+        for k, v in (headers or {}).items():
+            handler.send_header(k, v)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def handle(self, handler, method, path, query, body):
+        raise NotImplementedError
+
+
+def make_png(width, height, seed):
+    """生成 RGB PNG：渐变加细噪点（像照片，PNG 压不小），每行是同一条渐变带错开再加噪点"""
+    rnd = random.Random(seed)
+    size = width * 3
+    band = bytes((i * 240) // (3 * (width + height)) for i in range(3 * (width + height)))
+    # 噪点 0..15，和 0..240 的渐变逐字节相加不会进位，可以用大整数一次加完一行
+    noise = rnd.randbytes(size * height).translate(bytes(i % 16 for i in range(256)))
+    raw = b''.join(
+        b'\x00' + (int.from_bytes(band[y * 3:y * 3 + size], 'big') +
+                   int.from_bytes(noise[y * size:(y + 1) * size], 'big')).to_bytes(size, 'big')
+        for y in range(height))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+            chunk(b'tEXt', b'Software\x00fake camera ' + seed.hex().encode() * 8) +
+            chunk(b'IDAT', zlib.compress(raw, 6)) + chunk(b'IEND', b''))
+
+
+class FakeSite(FakeServer):
+    """
+    分类页 /<category>/ 有 groups 个 posit-box，每个 per_group 个产品
+    产品页 /products/<id>.html 由 pages/product.html 生成，小图每个产品一张，
+    大图（结构图）按 shared_images 张循环复用
+    revision 每加一，约 change_rate 比例的产品价格会变化，用来测增量同步
+    real_images=(宽, 高) 时图片是能解码的 PNG（带噪点和 tEXt 元数据），用来测图片压缩
+    """
+
+    def __init__(self, groups=3, per_group=20, shared_images=5, image_size=40 * 1024, change_rate=0.0,
+                 real_images=None, **kwargs):
+        super().__init__(**kwargs)
+        self.real_images = real_images
+        self.png_cache = {}
+        self.change_rate = change_rate
+        self.revision = 0
+        self.groups = groups
+        self.per_group = per_group
+        self.shared_images = max(shared_images, 1)
+        self.image_size = image_size
+
+        with open(os.path.join(PAGES_DIR, 'product.html'), encoding='utf-8') as f:
+            self.product_template = f.read()
+
+    def product_ids(self, category):
+        return [[f'{category.upper()}-{g}{i:03d}' for i in range(self.per_group)] for g in range(self.groups)]
+
+    def category_page(self, category):
+        out = ['<html><body>',
+               '<div class="nav-title"><span class="layui-breadcrumb">',
+               '<a href="/">Home</a>',
+               f'<a href="/{category}/">{html.escape(category.title())} Bearings</a>',
+               f'<a href="/{category}/all/">{html.escape(category.title())} Series</a>',
+               '</span></div>',
+               '<div class="boxT">']
+        for g, ids in enumerate(self.product_ids(category)):
+            out.append(f'<div class="posit-box"><h2><a href="/{category}/{g}/">{category.title()} Group {g}</a></h2><div class="hang">')
+            for pid in ids:
+                out.append(f'<a href="products/{pid.lower()}.html"><div class="Product">{pid}</div></a>')
+            out.append('</div></div>')
+        out.append('</div></body></html>')
+        return '\n'.join(out).encode('utf-8')
+
+    def changed(self, pid):
+        """这个产品在当前 revision 是否有变化"""
+        n = int(hashlib.md5(pid.encode()).hexdigest(), 16)
+        return bool(self.revision) and (n >> 8) % 1000 < self.change_rate * 1000
+
+    def sitemap(self, categories):
+        """产品的 sitemap，变化的产品 lastmod 跟着 revision 变"""
+        out = ['<?xml version="1.0" encoding="UTF-8"?>',
+               '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+        for category in categories:
+            for ids in self.product_ids(category):
+                for pid in ids:
+                    day = 1 + self.revision if self.changed(pid) else 1
+                    out.append(f'<url><loc>{self.url}/products/{pid.lower()}.html</loc>'
+                               f'<lastmod>2026-01-{day:02d}</lastmod></url>')
+        out.append('</urlset>')
+        return '\n'.join(out).encode('utf-8')
+
+    def product_page(self, pid):
+        n = int(hashlib.md5(pid.encode()).hexdigest(), 16)
+        page = self.product_template.replace('uploads/product/big/6205-2rs-structure.png',
+                                             f'uploads/product/big/series-{n % self.shared_images}.png')
+        page = page.replace('6205-2RS', pid).replace('6205-2rs', pid.lower())
+        if self.changed(pid):
+            page = page.replace('$ 3.56', f'$ {3.56 + self.revision:.2f}')
+        return page.encode('utf-8')
+
+    def image(self, path):
+        seed = hashlib.sha256(path.encode()).digest()
+        if self.real_images:
+            if path not in self.png_cache:
+                self.png_cache[path] = make_png(*self.real_images, seed)
+            return self.png_cache[path]
+        return (b'\x89PNG\r\n\x1a\n' + seed * (self.image_size // len(seed) + 1))[:self.image_size]
+
+    def send_page(self, handler, content):
+        """html 页面带 ETag，条件请求没变化时返回 304"""
+        etag = '"' + hashlib.md5(content).hexdigest() + '"'
+        if handler.headers.get('if-none-match') == etag:
+            return self.send(handler, 304, b'', headers={'etag': etag})
+        return self.send(handler, 200, content, 'text/html; charset=utf-8', {'etag': etag})
+
+    def handle(self, handler, method, path, query, body):
+        if path.startswith('/uploads/'):
+            content = self.image(path)
+            etag = '"' + hashlib.md5(content).hexdigest() + '"'
+            if handler.headers.get('if-none-match') == etag:
+                return self.send(handler, 304, b'', headers={'etag': etag})
+            return self.send(handler, 200, content, 'image/png', {'etag': etag})
+
+        if path == '/sitemap.xml':
+            return self.send(handler, 200, self.sitemap(query.get('categories', '').split(',')), 'application/xml')
+
+        hit = re.match(r'^/(?:[\w-]+/)?products/([\w-]+)\.html$', path)
+        if hit:
+            return self.send_page(handler, self.product_page(hit.group(1).upper()))
+
+        hit = re.match(r'^/([\w-]+)/$', path)
+        if hit:
+            return self.send_page(handler, self.category_page(hit.group(1)))
+
+        self.send(handler, 404, b'not found', 'text/plain')
+
+
+class FakeWordPress(FakeServer):
+    """只实现抓取程序用到的接口，数据都在内存里"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.next_id = 1
+        self.posts = {}
+        self.categories = {}
+        self.media = {}
+        self.writes = 0
+
+    def new_id(self):
+        with self.lock:
+            self.next_id += 1
+            return self.next_id
+
+    def product_map(self, product_ids=None):
+        with self.lock:
+            found = {}
+            for post_id, post in self.posts.items():
+                pid = post['meta'].get('product_id')
+                if pid and (product_ids is None or pid in product_ids) and pid not in found:
+                    found[pid] = {
+                        'article_id': post_id,
+                        'categories': [{'term_id': c} for c in post['categories']],
+                        'media_ids': [post['featured_media'], post['meta'].get('structure_pic')],
+                    }
+            return found
+
+    def handle(self, handler, method, path, query, body):
+        if path.endswith('/product_Api.php'):
+            return self.product_api(handler, method, query, body)
+
+        if path.endswith('/wp-json/batch/v1') and method == 'POST':
+            with self.lock:
+                self.writes += 1
+            return self.batch_api(handler, body)
+
+        api = path.split('/wp-json/wp/v2/', 1)[-1] if '/wp-json/wp/v2/' in path else None
+        if api is None:
+            return self.send(handler, 404, b'{}')
+
+        if method == 'POST':
+            with self.lock:
+                self.writes += 1
+
+        if api == 'categories':
+            return self.categories_api(handler, method, query, body)
+
+        if api == 'media' and method == 'POST':
+            media_id = self.new_id()
+            self.media[media_id] = len(body)
+            data = {'id': media_id, 'source_url': f'{self.url}/wp-content/uploads/{media_id}.png'}
+            return self.send(handler, 201, json.dumps(data).encode())
+
+        if method == 'POST':
+            status, data = self.posts_api(api, json.loads(body or b'{}'))
+            return self.send(handler, status, json.dumps(data).encode())
+
+        self.send(handler, 404, b'{}')
+
+    def batch_api(self, handler, body):
+        """/batch/v1，只支持 posts 的 POST"""
+        requests = json.loads(body or b'{}').get('requests', [])
+        if len(requests) > 25:
+            return self.send(handler, 400, b'{"code":"rest_invalid_param"}')
+
+        responses = []
+        for req in requests:
+            status, data = self.posts_api(req['path'].split('/wp/v2/', 1)[-1], req.get('body') or {})
+            responses.append({'body': data, 'status': status, 'headers': {}})
+        self.send(handler, 207, json.dumps({'responses': responses}).encode())
+
+    def posts_api(self, api, payload):
+        """创建或更新文章，返回 (status, data)"""
+        if api == 'posts':
+            post_id = self.new_id()
+            self.posts[post_id] = {
+                'title': payload.get('title'),
+                'categories': [int(c) for c in str(payload.get('categories', '')).split(',') if c],
+                'featured_media': payload.get('featured_media'),
+                'status': payload.get('status'),
+                'meta': payload.get('metadata', {}),
+            }
+            return 201, {'id': post_id}
+
+        hit = re.match(r'^posts/(\d+)$', api)
+        if hit:
+            post = self.posts.get(int(hit.group(1)))
+            if not post:
+                return 404, {'code': 'rest_post_invalid_id'}
+            if 'categories' in payload:
+                post['categories'] = [int(c) for c in str(payload['categories']).split(',') if c]
+            if 'featured_media' in payload:
+                post['featured_media'] = payload['featured_media']
+            for k in ('title', 'status'):
+                if k in payload:
+                    post[k] = payload[k]
+            post['meta'].update(payload.get('metadata', {}))
+            return 200, {'id': int(hit.group(1))}
+
+        return 404, {}
+
+    def categories_api(self, handler, method, query, body):
+        if method == 'GET':
+            per_page = int(query.get('per_page', 10))
+            page = int(query.get('page', 1))
+            items = sorted(self.categories.values(), key=lambda c: c['id'])
+            pages = max((len(items) + per_page - 1) // per_page, 1)
+            data = items[(page - 1) * per_page:page * per_page]
+            return self.send(handler, 200, json.dumps(data).encode(), headers={'X-WP-TotalPages': str(pages)})
+
+        payload = json.loads(body or b'{}')
+        name, parent = html.escape(payload['name']), int(payload.get('parent') or 0)
+        with self.lock:
+            for c in self.categories.values():
+                if c['name'] == name and c['parent'] == parent:
+                    data = {'code': 'term_exists', 'data': {'status': 400, 'term_id': c['id']}}
+                    return self.send(handler, 400, json.dumps(data).encode())
+
+        term_id = self.new_id()
+        self.categories[term_id] = {'id': term_id, 'name': name, 'parent': parent}
+        self.send(handler, 201, json.dumps(self.categories[term_id]).encode())
+
+    def product_api(self, handler, method, query, body):
+        if method == 'POST':
+            query.update(urllib.parse.parse_qsl(body.decode()))
+
+        if query.get('list'):
+            page, per_page = int(query.get('page', 1)), int(query.get('per_page', 1000))
+            items = sorted(self.product_map().items(), key=lambda x: x[1]['article_id'])
+            chunk = dict(items[(page - 1) * per_page:page * per_page])
+            data = {'exist': chunk or False, 'more': page * per_page < len(items)}
+            return self.send(handler, 200, json.dumps(data).encode())
+
+        if query.get('product_ids'):
+            found = self.product_map(set(query['product_ids'].split(',')))
+            return self.send(handler, 200, json.dumps({'exist': found or False}).encode())
+
+        found = self.product_map({query.get('product_id')})
+        if found:
+            exist = list(found.values())[0]
+            return self.send(handler, 200, json.dumps({'exist': exist}).encode())
+        self.send(handler, 200, json.dumps({'exist': False}).encode())
+
+
+class ProductApiServer(FakeServer):
+    """
+    product_Api.php 的 SQLite 替身，表结构和 WordPress 一致（postmeta 只有 meta_key 索引），
+    mode='meta' 执行原来扫描 postmeta 的查询，mode='index' 查 lily_products 表
+    """
+
+    def __init__(self, products=10000, mode='index', categories=20, **kwargs):
+        super().__init__(**kwargs)
+        self.mode = mode
+        self.db_lock = threading.Lock()
+        self.conn = sqlite3.connect(':memory:', check_same_thread=False)
+        self.conn.executescript('''
+            CREATE TABLE wp_posts (ID INTEGER PRIMARY KEY, post_type TEXT, post_status TEXT);
+            CREATE TABLE wp_postmeta (meta_id INTEGER PRIMARY KEY, post_id INTEGER, meta_key TEXT, meta_value TEXT);
+            CREATE INDEX postmeta_post_id ON wp_postmeta (post_id);
+            CREATE INDEX postmeta_meta_key ON wp_postmeta (meta_key);
+            CREATE TABLE wp_term_relationships (object_id INTEGER, term_taxonomy_id INTEGER,
+                                                PRIMARY KEY (object_id, term_taxonomy_id));
+            CREATE TABLE wp_lily_products (product_id TEXT PRIMARY KEY, post_id INTEGER, term_ids TEXT,
+                                           thumbnail_id INTEGER, structure_pic INTEGER);
+            CREATE INDEX lily_products_post_id ON wp_lily_products (post_id);
+        ''')
+        self.seed(products, categories)
+
+    @staticmethod
+    def product_id(i):
+        return f'P{i:07d}'
+
+    def seed(self, products, categories):
+        """每个产品一篇文章，带 product_id / _thumbnail_id / structure_pic / price 四个 meta 和一个分类"""
+        posts, meta, terms, index = [], [], [], []
+        for i in range(products):
+            post_id = i + 1
+            term_id = i % categories + 1
+            posts.append((post_id, 'post', 'publish'))
+            for key, value in (('product_id', self.product_id(i)), ('_thumbnail_id', 100000 + i),
+                               ('structure_pic', 200000 + i), ('price', '3.56')):
+                meta.append((post_id, key, str(value)))
+            terms.append((post_id, term_id))
+            index.append((self.product_id(i), post_id, str(term_id), 100000 + i, 200000 + i))
+
+        self.conn.executemany('INSERT INTO wp_posts VALUES (?, ?, ?)', posts)
+        self.conn.executemany('INSERT INTO wp_postmeta (post_id, meta_key, meta_value) VALUES (?, ?, ?)', meta)
+        self.conn.executemany('INSERT INTO wp_term_relationships VALUES (?, ?)', terms)
+        self.conn.executemany('INSERT INTO wp_lily_products VALUES (?, ?, ?, ?, ?)', index)
+        self.conn.commit()
+
+    def query(self, sql, params=()):
+        with self.db_lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def lookup_meta(self, product_ids):
+        """product_Api.php 原来的做法：按 meta_value 查 postmeta，再查分类"""
+        found, post_ids = {}, {}
+        rows = self.query(
+            'SELECT pm.post_id, pm.meta_value FROM wp_postmeta pm INNER JOIN wp_posts p ON p.ID = pm.post_id '
+            f'WHERE pm.meta_key = \'product_id\' AND pm.meta_value IN ({",".join("?" * len(product_ids))}) '
+            'AND p.post_type = \'post\' AND p.post_status NOT IN (\'trash\', \'auto-draft\')',
+            product_ids)
+        for post_id, pid in rows:
+            found[pid] = {'article_id': post_id, 'categories': []}
+            post_ids[post_id] = pid
+
+        if post_ids:
+            for object_id, term_id in self.query(
+                    'SELECT object_id, term_taxonomy_id FROM wp_term_relationships '
+                    f'WHERE object_id IN ({",".join("?" * len(post_ids))})', list(post_ids)):
+                found[post_ids[object_id]]['categories'].append({'term_id': term_id})
+        return found
+
+    def lookup_index(self, product_ids):
+        """lily_products 表按主键查询"""
+        rows = self.query(
+            'SELECT product_id, post_id, term_ids FROM wp_lily_products '
+            f'WHERE product_id IN ({",".join("?" * len(product_ids))})', product_ids)
+        return {pid: {'article_id': post_id, 'categories': [{'term_id': int(t)} for t in term_ids.split(',') if t]}
+                for pid, post_id, term_ids in rows}
+
+    def handle(self, handler, method, path, query, body):
+        if method == 'POST':
+            query.update(urllib.parse.parse_qsl(body.decode()))
+
+        lookup = self.lookup_index if self.mode == 'index' else self.lookup_meta
+        if query.get('product_ids'):
+            found = lookup(list(dict.fromkeys(query['product_ids'].split(','))))
+            return self.send(handler, 200, json.dumps({'exist': found or False}).encode())
+
+        found = lookup([query.get('product_id', '')])
+        exist = next(iter(found.values())) if found else False
+        self.send(handler, 200, json.dumps({'exist': exist}).encode())
@@ -0,0 +1,86 @@
+"""
+product_Api.php 压测：同一批数据分别用 postmeta 扫描（原来的做法）和 lily_products 索引表查询，
+多个线程并发请求单个查询和 100 个一批的查询，输出吞吐量和延迟
+
+python bench/load_product_api.py --products 50000 --clients 8 --requests 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import http_pool
+from fake_servers import ProductApiServer
+
+
+def load(server, args, batch):
+    """clients 个线程各发 requests 个请求，命中和未命中约各一半"""
+    http = http_pool.SessionPool(args.clients)
+    url = server.url + '/product_Api.php'
+    latencies, lock = [], threading.Lock()
+
+    def client(seed):
+        rnd = random.Random(seed)
+        mine = []
+        for _ in range(args.requests):
+            ids = [ProductApiServer.product_id(rnd.randrange(args.products * 2)) for _ in range(batch)]
+            start = time.perf_counter()
+            if batch == 1:
+                r = http.get(url, params={'product_id': ids[0]})
+            else:
+                r = http.post(url, data={'product_ids': ','.join(ids)})
+            r.raise_for_status()
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def parity(server, args):
+    """两种查询方式结果一致"""
+    rnd = random.Random(1)
+    ids = [ProductApiServer.product_id(rnd.randrange(args.products * 2)) for _ in range(500)]
+    return server.lookup_meta(ids) == server.lookup_index(ids)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=50000)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='requests per client')
+    parser.add_argument('--latency', type=float, default=0.0, help='extra latency per request (s)')
+    args = parser.parse_args()
+
+    print(f'{args.products} products, {args.clients} clients x {args.requests} requests')
+    print(f'{"mode":<8}{"lookup":<10}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}')
+    for mode in ('meta', 'index'):
+        with ProductApiServer(products=args.products, mode=mode, latency=args.latency) as server:
+            if mode == 'index':
+                print(f'parity with meta lookup: {parity(server, args)}')
+            for batch in (1, 100):
+                result = load(server, args, batch)
+                print(f'{mode:<8}{"single" if batch == 1 else "batch100":<10}{result["rps"]:>10.1f}'
+                      f'{result["p50"]:>10.2f}{result["p95"]:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
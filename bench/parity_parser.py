@@ -0,0 +1,93 @@
+"""
+检查 lxml 与 BeautifulSoup 两种解析结果完全一致、非 ASCII 文字解码正确，并比较解析耗时
+
+python bench/parity_parser.py [page.html ...] [--number 200]
+文件名以 category 开头的按分类页解析，其余按产品页解析；两种解析都出错（比如没有价格）也算一致
+"""
+import argparse
+import html
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import page_parser
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+
+# 页面里没有 <meta charset>、编码只在响应头里的，这里是响应头声明的 charset
+ENCODINGS = {
+    'product_gbk.html': 'gbk',
+}
+
+
+def comparable(result):
+    """SpecTable 换成行数据方便比较"""
+    result = dict(result)
+    if 'table' in result:
+        result['table'] = result['table'].rows
+    return result
+
+
+def parse(backend, method, content, encoding):
+    try:
+        return comparable(getattr(backend, method)(content, encoding))
+    except Exception:
+        # 两种解析抛的异常类型不同（ValueError / AttributeError），只比较是否出错
+        return {'error': True}
+
+
+def texts(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from texts(v)
+    elif isinstance(value, list):
+        for v in value:
+            yield from texts(v)
+
+
+def decoded(result, page_text):
+    """解析结果里的非 ASCII 字符都要在页面里出现，乱码（比如 utf-8 当作 latin-1）会多出别的字符"""
+    return {c for t in texts(result) for c in t if ord(c) > 127} <= set(page_text)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('pages', nargs='*')
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+
+    pages = args.pages or [os.path.join(PAGES_DIR, f) for f in sorted(os.listdir(PAGES_DIR)) if f.endswith('.html')]
+    backends = [page_parser.get_parser(name) for name in page_parser.PARSERS]
+
+    failed = 0
+    for page in pages:
+        with open(page, 'rb') as f:
+            content = f.read()
+
+        name = os.path.basename(page)
+        encoding = ENCODINGS.get(name)
+        page_text = html.unescape(content.decode(encoding or 'utf-8'))
+        method = 'parse_category' if name.startswith('category') else 'parse_product'
+        results = [parse(b, method, content, encoding) for b in backends]
+        same = all(r == results[0] for r in results[1:]) and all(decoded(r, page_text) for r in results)
+        failed += not same
+
+        timings = []
+        for b in backends:
+            t = timeit.timeit(lambda: parse(b, method, content, encoding), number=args.number) / args.number
+            timings.append(f'{b.name}={t * 1e6:.0f} us')
+
+        print(f'{name}: identical={same} {" ".join(timings)}')
+        if not same:
+            for b, r in zip(backends, results):
+                print(f'--- {b.name}\n{r}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import html
+import json
+import os
+import threading
+
+
+class CategoryCache:
+    """分类ID缓存，key 为 (分类名, 父分类ID)，内存 + 本地 json 文件"""
+
+    def __init__(self, path='./data/categories.json'):
+        self.path = path
+        self.lock = threading.Lock()
+        self.items = {}
+
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for name, parent_id, term_id in json.load(f):
+                    self.items[self.key(name, parent_id)] = term_id
+
+    @staticmethod
+    def key(name, parent_id):
+        # WordPress 返回的分类名是 html 转义过的
+        return html.unescape(str(name)).strip().lower(), str(parent_id)
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, name, parent_id):
+        with self.lock:
+            return self.items.get(self.key(name, parent_id))
+
+    def put(self, name, parent_id, term_id, save=True):
+        with self.lock:
+            self.items[self.key(name, parent_id)] = term_id
+            if save:
+                self._save()
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+    def clear(self):
+        with self.lock:
+            self.items = {}
+
+    def _save(self):
+        if not self.path:
+            return
+
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump([[k[0], k[1], v] for k, v in self.items.items()], f, ensure_ascii=False)
+        os.replace(tmp, self.path)
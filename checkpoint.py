@@ -0,0 +1,98 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# 产品处理进度，按顺序推进
+DISCOVERED = 'discovered'
+FETCHED = 'fetched'
+MEDIA_UPLOADED = 'media_uploaded'
+POSTED = 'posted'
+UPDATED = 'updated'
+
+FINISHED = (POSTED, UPDATED)
+
+
+class Checkpoint:
+    """
+    抓取进度日志（SQLite），记录每个分类下每个产品的状态和已完成的中间结果，
+    --resume 时从中断的地方继续
+    """
+
+    def __init__(self, path='./data/checkpoint.db'):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS journal ('
+            'category TEXT, '
+            'product TEXT, '
+            'state TEXT, '
+            'data TEXT, '
+            'updated_at REAL, '
+            'PRIMARY KEY (category, product))'
+        )
+        self.conn.commit()
+
+    def start(self, category, resume=False):
+        """开始一个分类，不续传时清掉之前的记录"""
+        if resume:
+            return
+
+        with self.lock:
+            self.conn.execute('DELETE FROM journal WHERE category = ?', (category,))
+            self.conn.commit()
+
+    def discover(self, category, products):
+        with self.lock:
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO journal (category, product, state, data, updated_at) VALUES (?, ?, ?, ?, ?)',
+                [(category, p, DISCOVERED, '{}', time.time()) for p in products],
+            )
+            self.conn.commit()
+
+    def get(self, category, product):
+        """返回 (state, data)，没有记录返回 (None, {})"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT state, data FROM journal WHERE category = ? AND product = ?',
+                (category, product),
+            ).fetchone()
+
+        if not row:
+            return None, {}
+        return row[0], json.loads(row[1] or '{}')
+
+    def mark(self, category, product, state=None, **data):
+        """更新状态（state 为 None 时不变），data 合并进已有的中间结果"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT state, data FROM journal WHERE category = ? AND product = ?',
+                (category, product),
+            ).fetchone()
+
+            merged = json.loads(row[1] or '{}') if row else {}
+            merged.update(data)
+            state = state or (row[0] if row else DISCOVERED)
+
+            self.conn.execute(
+                'INSERT OR REPLACE INTO journal (category, product, state, data, updated_at) VALUES (?, ?, ?, ?, ?)',
+                (category, product, state, json.dumps(merged, ensure_ascii=False), time.time()),
+            )
+            self.conn.commit()
+
+    def summary(self, category):
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT state, COUNT(*) FROM journal WHERE category = ? GROUP BY state',
+                (category,),
+            ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
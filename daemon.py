@@ -0,0 +1,69 @@
+import signal
+import threading
+import time
+
+from loguru import logger
+
+import batch
+from metrics import METRICS
+
+
+def serve(scrape_obj, spool_obj, concurrency=2, poll=1.0):
+    """
+    常驻进程：从 spool 领取分类任务依次运行，
+    连接池、限速、分类/图片/页面缓存、解析器和线程池在任务之间保持
+    SIGTERM / Ctrl-C 时做完当前任务再退出
+    """
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        if stopping.is_set():
+            raise KeyboardInterrupt
+        logger.warning('Stopping after the current job, press Ctrl-C again to abort')
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    recovered = spool_obj.recover()
+    if recovered:
+        logger.warning(f'Requeued {recovered} unfinished jobs')
+
+    logger.info(f'Daemon waiting for jobs in {spool_obj.path}')
+    while not stopping.is_set():
+        name, job = spool_obj.take()
+        if not name:
+            stopping.wait(poll)
+            continue
+
+        logger.info(f'Job {name}: {job}')
+        started = time.monotonic()
+        ok = run_job(scrape_obj, job, concurrency)
+        spool_obj.finish(name, ok)
+        logger.info(f'Job {name} {"finished" if ok else "failed"} in {time.monotonic() - started:.1f}s, '
+                    f'{spool_obj.pending()} pending')
+
+
+def run_job(scrape_obj, job, concurrency=2):
+    """运行一个任务 {'link' 或 'links', 'categories', 'sync', 'resume'}"""
+    METRICS.reset()
+
+    job_obj = scrape_obj.spawn(job.get('link') or '')
+    job_obj.sync = job.get('sync') or scrape_obj.sync
+    job_obj.resume = bool(job.get('resume'))
+
+    try:
+        if job_obj.discovery:
+            # 常驻时每个任务都重新读取 sitemap
+            job_obj.discovery.refresh(job_obj)
+
+        if job.get('links'):
+            batch.run_batch(job_obj, batch.load_links(job['links'], job_obj), job.get('categories') or concurrency)
+        else:
+            job_obj.report_metrics = True
+            job_obj.run()
+    except Exception as e:
+        logger.error(f'Job failed: {e}')
+        return False
+
+    return True
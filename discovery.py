@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+from loguru import logger
+from lxml import etree
+
+
+class Discovery:
+    """
+    增量发现（SQLite）：保存每个分类上次抓到的产品列表和 sitemap 的 lastmod，
+    下次只处理新出现的、lastmod 变化的和还没发布成功的产品，并报告从分类里消失的产品
+    """
+
+    def __init__(self, path='./data/discovery.db', sitemap=None):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # sitemap 里的 url path -> lastmod
+        self.sitemap = sitemap
+        self.lastmods = {}
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS listing ('
+            'category TEXT, product TEXT, lastmod TEXT, seen_at REAL, '
+            'PRIMARY KEY (category, product))'
+        )
+        self.conn.commit()
+
+    def refresh(self, scrape_obj=None):
+        """重新读取 sitemap 的 lastmod，每次运行前调用"""
+        if not self.sitemap:
+            return 0
+
+        self.lastmods = {}
+        return self.load_sitemap(self.sitemap, scrape_obj)
+
+    def load_sitemap(self, source, scrape_obj=None):
+        """读取 sitemap（文件或 url，sitemap index 会继续读取子 sitemap）里的 lastmod"""
+        if source.startswith('http://') or source.startswith('https://'):
+            r = scrape_obj.fetch(source, 30, revalidate=True)
+            if r.status_code != 200:
+                raise Exception(f"Fetch {source} failed, {r.status_code}")
+            content = r.content
+        else:
+            with open(source, 'rb') as f:
+                content = f.read()
+
+        root = etree.fromstring(content)
+        if etree.QName(root).localname == 'sitemapindex':
+            for loc in root.iter('{*}loc'):
+                if loc.text:
+                    self.load_sitemap(loc.text.strip(), scrape_obj)
+            return len(self.lastmods)
+
+        for url in root.iter('{*}url'):
+            loc, lastmod = url.findtext('{*}loc'), url.findtext('{*}lastmod')
+            if loc and lastmod:
+                self.lastmods[self.path_of(loc)] = lastmod.strip()
+
+        logger.info(f'Sitemap {source}: {len(self.lastmods)} lastmod entries')
+        return len(self.lastmods)
+
+    @staticmethod
+    def path_of(url):
+        """按 path 匹配，sitemap 和分类页里的 host 写法可能不同"""
+        return urllib.parse.urlsplit(url.strip()).path
+
+    def lastmod(self, url):
+        return self.lastmods.get(self.path_of(url))
+
+    def snapshot(self, category):
+        """上次保存的产品列表 {product: lastmod}"""
+        with self.lock:
+            rows = self.conn.execute('SELECT product, lastmod FROM listing WHERE category = ?', (category,)).fetchall()
+        return dict(rows)
+
+    def changed(self, product, previous, posted=True):
+        """
+        是否需要处理
+        :param previous: snapshot()
+        :param posted: 是否已经发布过（在 product 索引或 WordPress 里）
+        """
+        if product not in previous or not posted:
+            return True
+
+        lastmod = self.lastmod(product)
+        return lastmod is not None and lastmod != previous[product]
+
+    def save(self, category, products, previous, failed=()):
+        """
+        用这次的产品列表替换快照，返回消失的产品
+        :param failed: 这次处理失败的产品，保留旧的 lastmod，下次还会处理
+        """
+        rows = {}
+        for product in products:
+            if product in failed:
+                if product in previous:
+                    rows[product] = previous[product]
+            else:
+                rows[product] = self.lastmod(product)
+
+        current = set(products)
+        removed = [p for p in previous if p not in current]
+        now = time.time()
+        with self.lock:
+            self.conn.execute('DELETE FROM listing WHERE category = ?', (category,))
+            self.conn.executemany(
+                'INSERT INTO listing (category, product, lastmod, seen_at) VALUES (?, ?, ?, ?)',
+                [(category, p, lastmod, now) for p, lastmod in rows.items()],
+            )
+            self.conn.commit()
+
+        return removed
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,264 @@
+import csv
+import re
+import threading
+import time
+from xml.sax.saxutils import escape
+
+from loguru import logger
+
+import checkpoint
+from metrics import METRICS
+
+FORMATS = ('wxr', 'csv')
+
+# 导出文件里的文章、图片和分类 ID 从这里开始，WordPress Importer 导入时 ID 空闲就会沿用，
+# structure_pic 里存的图片 ID 才对得上
+START_ID = 100000
+
+main_category_id = 0  # 主分类ID
+
+CSV_COLUMNS = ['product_id', 'title', 'status', 'categories', 'featured_image', 'structure_pic',
+               'price', 'table1', 'table2', 'size']
+
+WXR_HEAD = '''<?xml version="1.0" encoding="UTF-8" ?>
+<rss version="2.0"
+    xmlns:excerpt="http://wordpress.org/export/1.2/excerpt/"
+    xmlns:content="http://purl.org/rss/1.0/modules/content/"
+    xmlns:wfw="http://wellformedweb.org/CommentAPI/"
+    xmlns:dc="http://purl.org/dc/elements/1.1/"
+    xmlns:wp="http://wordpress.org/export/1.2/">
+<channel>
+<title>lily-bearing products</title>
+<link>{domain}</link>
+<wp:wxr_version>1.2</wp:wxr_version>
+<wp:base_site_url>{domain}</wp:base_site_url>
+<wp:base_blog_url>{domain}</wp:base_blog_url>
+'''
+
+WXR_FOOT = '</channel>\n</rss>\n'
+
+
+def cdata(value):
+    return '<![CDATA[' + str(value if value is not None else '').replace(']]>', ']]]]><![CDATA[>') + ']]>'
+
+
+def slugify(name):
+    return re.sub(r'[^a-z0-9]+', '-', str(name).lower()).strip('-') or 'category'
+
+
+class Exporter:
+    """
+    导出后端，代替 wpApi.Api：产品边抓边写到 WordPress 导入文件，不调用 REST 接口
+    wxr: WordPress Importer 用的 WXR，图片作为附件由导入时下载
+    csv: WP All Import 用的 CSV，图片是 url
+    文件是流式写入的，内存里只保留分类和已导出产品的 ID、标题
+    """
+
+    def __init__(self, path, fmt=None, my_domain=None):
+        self.path = path
+        self.fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'wxr')
+        if self.fmt not in FORMATS:
+            raise ValueError(f'Unknown export format {self.fmt}, choose from {", ".join(FORMATS)}')
+
+        self.my_domain = my_domain or 'https://products.com'
+        self.lock = threading.Lock()
+        self.next_id = START_ID
+
+        # (分类名, 父分类ID) -> 分类ID，分类ID -> (分类名, 父分类ID, slug)
+        self.terms = {}
+        self.term_info = {}
+        self.slugs = set()
+        # product_id -> {'article_id', 'title', 'date', 'cat_ids'}，同一个产品出现在多个分类时用来合并分类
+        self.products = {}
+        self.articles = {}
+        # 图片url -> 附件ID，多个产品共用的图片只导出一次
+        self.images = {}
+
+        self.file = open(path, 'w', encoding='utf-8', newline='')
+        if self.fmt == 'csv':
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(CSV_COLUMNS)
+        else:
+            self.file.write(WXR_HEAD.format(domain=escape(self.my_domain)))
+
+    def new_id(self):
+        """调用方持有 self.lock"""
+        self.next_id += 1
+        return self.next_id
+
+    def warm_categories(self, refresh=False):
+        pass
+
+    def build_categories(self, categories):
+        """建立 1，2 级分类，并返回分类ID 的集合，和 wpApi.Api.build_categories 一样"""
+        level3_ids = set()
+        for c in categories:
+            level1_id = self.create_category(c['level1']['name'], main_category_id)
+            level2_id = self.create_category(c['level2']['name'], level1_id)
+            level3_ids.add(level2_id)
+
+        return level3_ids
+
+    def create_category(self, category_name, category_parent_id):
+        with self.lock:
+            term_id = self.terms.get((category_name, category_parent_id))
+            if term_id:
+                return term_id
+
+            term_id = self.new_id()
+            slug = slugify(category_name)
+            if slug in self.slugs:
+                slug = f'{slug}-{term_id}'
+            self.slugs.add(slug)
+            self.terms[(category_name, category_parent_id)] = term_id
+            self.term_info[term_id] = (category_name, category_parent_id, slug)
+
+            if self.fmt == 'wxr':
+                parent = self.term_info[category_parent_id][2] if category_parent_id in self.term_info else ''
+                self.file.write(f'<wp:category><wp:term_id>{term_id}</wp:term_id>'
+                                f'<wp:category_nicename>{escape(slug)}</wp:category_nicename>'
+                                f'<wp:category_parent>{escape(parent)}</wp:category_parent>'
+                                f'<wp:cat_name>{cdata(category_name)}</wp:cat_name></wp:category>\n')
+            return term_id
+
+    def category_path(self, term_id):
+        """WP All Import 的层级分类写法 Level1>Level2"""
+        names = []
+        while term_id in self.term_info:
+            name, term_id, _ = self.term_info[term_id]
+            names.append(name)
+        return '>'.join(reversed(names))
+
+    def exported(self, product_ids):
+        """代替 product_Api.php：这次已经导出的产品，{product_id: {'article_id': .., 'cat_ids': set()}}"""
+        with self.lock:
+            return {pid: {'article_id': self.products[pid]['article_id'], 'cat_ids': set(self.products[pid]['cat_ids'])}
+                    for pid in product_ids if pid in self.products}
+
+    def post_article(self, title, category_ids, product_id, small_pic_url, big_pic_url, price, table1, table2, size,
+                     media=None, progress=None, failed=None):
+        """写一篇文章到导出文件，返回文章ID"""
+        with self.lock:
+            article_id = self.new_id()
+            date = time.strftime('%Y-%m-%d %H:%M:%S')
+            self.products[product_id] = {'article_id': article_id, 'title': title, 'date': date,
+                                         'cat_ids': set(category_ids)}
+            self.articles[article_id] = product_id
+
+            if self.fmt == 'csv':
+                self.writer.writerow([product_id, title, 'publish', self.categories_cell(category_ids),
+                                      small_pic_url, big_pic_url, price, table1, table2, size])
+            else:
+                attachments = []
+                feature_id = self.attachment_id(small_pic_url, attachments)
+                structure_pic_id = self.attachment_id(big_pic_url, attachments)
+                self.write_item(article_id, title, date, category_ids, {
+                    '_thumbnail_id': feature_id,
+                    'product_id': product_id,
+                    'price': price,
+                    'structure_pic': structure_pic_id,
+                    'table1': table1,
+                    'table2': table2,
+                    'size': size,
+                })
+                for attachment_id, url in attachments:
+                    self.write_attachment(attachment_id, url, title, date, article_id)
+
+        logger.success(f'Export {title}')
+        METRICS.count('exported')
+        if progress:
+            progress(checkpoint.POSTED, article_id=article_id)
+        return article_id
+
+    def update_article(self, article_id, category_ids=None, fields=None, then=None, missing=None):
+        """
+        导出文件里的文章不能再修改，只能合并分类：再写一条同标题、同日期的记录（ID 不同，否则会被跳过），
+        WordPress Importer 会把分类加到已导入的文章上，WP All Import 按 product_id 更新
+        """
+        with self.lock:
+            product_id = self.articles.get(article_id)
+            if product_id is not None and category_ids is not None:
+                product = self.products[product_id]
+                product['cat_ids'] = set(category_ids)
+                if self.fmt == 'csv':
+                    self.writer.writerow([product_id, product['title'], 'publish',
+                                          self.categories_cell(category_ids)] + [''] * 6)
+                else:
+                    self.write_item(self.new_id(), product['title'], product['date'], category_ids, {})
+
+        if product_id is None:
+            logger.error(f'Update {article_id} failed: not in this export')
+            return then(False) if then else False
+
+        METRICS.count('updated')
+        return then(True) if then else True
+
+    def sync_article(self, article_id, payload, changed, category_ids=None, then=None, missing=None):
+        """导出时产品只写一次，同步只合并分类"""
+        def done(ok):
+            result = ([], {}) if ok else None
+            return then(result) if then else result
+
+        if category_ids is None:
+            return done(True)
+        return self.update_article(article_id, category_ids, then=done)
+
+    def categories_cell(self, category_ids):
+        return '|'.join(self.category_path(term_id) for term_id in sorted(category_ids))
+
+    def attachment_id(self, url, attachments):
+        """调用方持有 self.lock，第一次出现的图片加到 attachments"""
+        if not url:
+            return ''
+        if url not in self.images:
+            self.images[url] = self.new_id()
+            attachments.append((self.images[url], url))
+        return self.images[url]
+
+    def write_item(self, article_id, title, date, category_ids, meta):
+        out = ['<item>',
+               f'<title>{escape(title)}</title>',
+               f'<wp:post_id>{article_id}</wp:post_id>',
+               f'<wp:post_date>{date}</wp:post_date>',
+               f'<wp:post_name>{escape(slugify(title))}</wp:post_name>',
+               '<wp:status>publish</wp:status>',
+               '<wp:post_parent>0</wp:post_parent>',
+               '<wp:post_type>post</wp:post_type>',
+               '<content:encoded><![CDATA[]]></content:encoded>']
+        for term_id in sorted(category_ids):
+            if term_id in self.term_info:
+                name, _, slug = self.term_info[term_id]
+                out.append(f'<category domain="category" nicename="{escape(slug)}">{cdata(name)}</category>')
+        for k, v in meta.items():
+            out.append(f'<wp:postmeta><wp:meta_key>{k}</wp:meta_key><wp:meta_value>{cdata(v)}</wp:meta_value></wp:postmeta>')
+        out.append('</item>\n')
+        self.file.write('\n'.join(out))
+
+    def write_attachment(self, attachment_id, url, title, date, parent_id):
+        self.file.write('\n'.join([
+            '<item>',
+            f'<title>{escape(title)}</title>',
+            f'<guid isPermaLink="false">{escape(url)}</guid>',
+            f'<wp:post_id>{attachment_id}</wp:post_id>',
+            f'<wp:post_date>{date}</wp:post_date>',
+            '<wp:status>inherit</wp:status>',
+            f'<wp:post_parent>{parent_id}</wp:post_parent>',
+            '<wp:post_type>attachment</wp:post_type>',
+            f'<wp:attachment_url>{escape(url)}</wp:attachment_url>',
+            '</item>\n',
+        ]))
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file.closed:
+                return
+            if self.fmt == 'wxr':
+                self.file.write(WXR_FOOT)
+            self.file.close()
+
+        logger.info(f'Export {len(self.products)} products, {len(self.images)} images, '
+                    f'{len(self.term_info)} categories to {self.path}')
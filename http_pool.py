@@ -0,0 +1,47 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class SessionPool:
+    """
+    线程安全的连接池：每个线程一个 Session（cookies/headers 互不干扰），
+    所有 Session 共用同一组 HTTPAdapter，因此 keep-alive 连接在线程间复用
+    """
+
+    def __init__(self, pool_size=10, headers=None, auth=None, pool_connections=4):
+        self.headers = dict(headers or {})
+        self.headers.setdefault('accept-encoding', 'gzip, deflate')
+        self.headers.setdefault('connection', 'keep-alive')
+        self.auth = auth
+
+        self.http_adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_size, pool_block=True)
+        self.https_adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_size, pool_block=True)
+        self.local = threading.local()
+
+    @property
+    def session(self):
+        s = getattr(self.local, 'session', None)
+        if s is None:
+            s = requests.Session()
+            s.headers.update(self.headers)
+            s.auth = self.auth
+            s.verify = False
+            s.mount('http://', self.http_adapter)
+            s.mount('https://', self.https_adapter)
+            self.local.session = s
+        return s
+
+    def request(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **kwargs)
+
+    def close(self):
+        self.http_adapter.close()
+        self.https_adapter.close()
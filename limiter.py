@@ -0,0 +1,60 @@
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+
+
+class TokenBucket:
+    """令牌桶限速，rate 为每秒令牌数，capacity 为允许的突发量"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = max(float(capacity), 1.0)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """阻塞直到拿到令牌"""
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+
+                wait = (tokens - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class HostLimiter:
+    """限制每个 host 的并发连接数"""
+
+    def __init__(self, per_host=4):
+        self.per_host = max(int(per_host), 1)
+        self.semaphores = {}
+        self.lock = threading.Lock()
+
+    def semaphore(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self.semaphores[host]
+
+    @contextmanager
+    def slot(self, url):
+        """with limiter.slot(url): 占用该 host 的一个并发名额"""
+        sem = self.semaphore(url)
+        sem.acquire()
+        try:
+            yield
+        finally:
+            sem.release()
@@ -1,19 +1,149 @@
+import os
 import re
 import time
 import fc
 import click
-from scrape import Scrape
-from loguru import logger
+
+# 抓取相关的模块（requests、lxml、magic ...）在 run() 里再导入，--help 和 --enqueue 不需要加载
 
 
 @click.command()
 @click.option('--link', default="", help='Category Url.')
-def run(link):
+@click.option('--links', default="", help='File or sitemap (path or url) of category urls for batch mode.')
+@click.option('--categories', default=2, help='Categories crawled at the same time in batch mode.')
+@click.option('--workers', default=1, help='Concurrent product workers, 1 = serial mode.')
+@click.option('--per-host', default=4, help='Max concurrent connections per host.')
+@click.option('--rate', default=1.0, help='Products started per second (token bucket).')
+@click.option('--pool-size', default=10, help='Keep-alive connections kept per host.')
+@click.option('--parser', default="lxml", type=click.Choice(['lxml', 'soup']), help='HTML parser backend.')
+@click.option('--index', default="./data/products.db", help='Local product index file, empty to disable.')
+@click.option('--category-cache', default="./data/categories.json", help='Category ID cache file, empty for memory only.')
+@click.option('--media-cache', default="./data/media.db", help='Image dedup cache file, empty to disable.')
+@click.option('--page-cache', default="./data/pages.db", help='Category/product page cache file, empty to disable.')
+@click.option('--page-ttl', default=12.0, help='Hours a cached page is used without revalidating.')
+@click.option('--page-cache-mb', default=512, help='Max size of the page cache, least recently used pages are evicted.')
+@click.option('--offline', is_flag=True, help='Serve category/product pages only from the page cache.')
+@click.option('--checkpoint', default="./data/checkpoint.db", help='Crawl checkpoint journal file, empty to disable.')
+@click.option('--resume', is_flag=True, help='Continue the category from the checkpoint journal.')
+@click.option('--metrics-out', default="", help='Write crawl metrics to this file (.prom for Prometheus textfile, else json).')
+@click.option('--cloudwatch', default="", help='CloudWatch log group, ship WARNING logs there in batches.')
+@click.option('--resync', is_flag=True, help='Rebuild the local product index and category cache from WordPress.')
+@click.option('--batch-size', default=25, help='Post creates/updates sent per /batch/v1 request (max 25), 0 = one request each.')
+@click.option('--sync', is_flag=True, help='Re-scrape existing products and update only the fields that changed.')
+@click.option('--incremental', is_flag=True, help='Only process products that are new, changed in the sitemap or not posted yet.')
+@click.option('--sitemap', default="", help='Sitemap (path or url) whose lastmod values mark changed products, for --incremental.')
+@click.option('--discovery', default="./data/discovery.db", help='Category listing snapshots used by --incremental.')
+@click.option('--optimize-images', default="", type=click.Choice(['', 'webp', 'jpeg']),
+              help='Re-encode images before upload (needs Pillow), empty to upload originals.')
+@click.option('--image-quality', default=80, help='Encoder quality for --optimize-images.')
+@click.option('--image-max-size', default=1600, help='Longest image side in pixels for --optimize-images.')
+@click.option('--image-workers', default=2, help='Processes used by --optimize-images.')
+@click.option('--media-queue', default=0, help='Publish posts first and upload images with this many threads, 0 = upload before posting.')
+@click.option('--media-draft', is_flag=True, help='With --media-queue, keep posts as drafts until their images are attached.')
+@click.option('--export', default="", help='Write products to a WordPress import file instead of calling the REST API.')
+@click.option('--export-format', default="", type=click.Choice(['', 'wxr', 'csv']),
+              help='wxr for WordPress Importer, csv for WP All Import, empty to pick by the --export extension.')
+@click.option('--daemon', is_flag=True, help='Stay resident and run category jobs from the spool directory.')
+@click.option('--enqueue', is_flag=True, help='Queue --link/--links as a job for the daemon and exit.')
+@click.option('--spool', default="./data/spool", help='Job spool directory shared by --daemon and --enqueue.')
+def run(link, links, categories, workers, per_host, rate, pool_size, parser, index, category_cache, media_cache,
+        page_cache, page_ttl, page_cache_mb, offline, checkpoint, resume, metrics_out, cloudwatch, resync, batch_size,
+        sync, incremental, sitemap, discovery, optimize_images, image_quality, image_max_size, image_workers,
+        media_queue, media_draft, export, export_format, daemon, enqueue, spool):
+    if enqueue:
+        import spool as spool_mod
+        if not link and not links:
+            raise click.UsageError('--enqueue needs --link or --links')
+
+        if links and os.path.exists(links):
+            # daemon 的工作目录可能不同
+            links = os.path.abspath(links)
+        name = spool_mod.Spool(spool).put({'link': link, 'links': links, 'categories': categories,
+                                           'sync': sync, 'resume': resume})
+        click.echo(f'Queued {name}')
+        return
+
+    if export and (daemon or resume):
+        raise click.UsageError('--export writes a new file each run, it cannot be used with --daemon or --resume')
+
+    from loguru import logger
+    from scrape import Scrape
+    from product_index import ProductIndex
+    from category_cache import CategoryCache
+    from media_cache import MediaCache
+    from page_cache import PageCache
+    from checkpoint import Checkpoint
+    from discovery import Discovery
+    import batch
+
     logger.add("./log/log_{time}.txt", level="WARNING", format='{message}')
+    if cloudwatch:
+        import repeated
+        logger.add(repeated.CloudWatchSink(group_name=cloudwatch), level="WARNING", format='{message}')
+
+    index_obj = ProductIndex(index) if index else None
+    categories_obj = CategoryCache(category_cache)
+    media_obj = MediaCache(media_cache) if media_cache else None
+    journal_obj = Checkpoint(checkpoint) if checkpoint else None
+    pages_obj = PageCache(page_cache, ttl=page_ttl * 3600, max_bytes=page_cache_mb * 1024 * 1024,
+                          offline=offline) if page_cache else None
+    discovery_obj = Discovery(discovery, sitemap=sitemap) if incremental else None
+    optimizer_obj = None
+    if optimize_images:
+        from image_optimizer import ImageOptimizer
+        optimizer_obj = ImageOptimizer(optimize_images, quality=image_quality, max_size=image_max_size,
+                                       workers=image_workers)
+
+    exporter_obj = None
+    if export:
+        from export import Exporter
+        exporter_obj = Exporter(export, export_format or None)
+
+    if sync and not index_obj and not exporter_obj:
+        logger.warning('--sync without --index has no stored hashes, every existing product will be fully updated')
+
+    if resync:
+        resync_obj = Scrape(link, index=index_obj, categories=categories_obj)
+        resync_obj.resync_index()
+        resync_obj.wp_cls.warm_categories(refresh=True)
+        if not link and not links and not daemon:
+            return
+
+    if daemon:
+        import spool as spool_mod
+        import daemon as daemon_mod
+        scrape_obj = Scrape('', workers=workers, per_host=per_host, rate=rate, index=index_obj,
+                            categories=categories_obj, pool_size=pool_size, media=media_obj,
+                            parser=parser, journal=journal_obj, metrics_out=metrics_out, sync=sync,
+                            pages=pages_obj, batch_size=batch_size, discovery=discovery_obj,
+                            optimizer=optimizer_obj, media_queue=media_queue, media_draft=media_draft)
+        daemon_mod.serve(scrape_obj, spool_mod.Spool(spool), categories)
+
+        if scrape_obj.scheduler:
+            scrape_obj.scheduler.close()
+        if optimizer_obj:
+            optimizer_obj.close()
+    elif link or links:
+        scrape_obj = Scrape(link, workers=workers, per_host=per_host, rate=rate, index=index_obj,
+                            categories=categories_obj, pool_size=pool_size, media=media_obj,
+                            parser=parser, journal=journal_obj, resume=resume,
+                            metrics_out=metrics_out, sync=sync, pages=pages_obj, batch_size=batch_size,
+                            discovery=discovery_obj, optimizer=optimizer_obj, media_queue=media_queue,
+                            media_draft=media_draft, exporter=exporter_obj)
+        if discovery_obj:
+            discovery_obj.refresh(scrape_obj)
+
+        if links:
+            batch.run_batch(scrape_obj, batch.load_links(links, scrape_obj), categories)
+        else:
+            scrape_obj.run()
 
-    if link:
-        scrape_obj = Scrape(link)
-        scrape_obj.run()
+        if scrape_obj.scheduler:
+            scrape_obj.scheduler.close()
+        if optimizer_obj:
+            optimizer_obj.close()
+        if exporter_obj:
+            exporter_obj.close()
     else:
         logger.error('Category link and Parent category ID is empty')
         logger.info('--help         Show param help.')
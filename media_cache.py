@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class MediaCache:
+    """
+    图片去重缓存（SQLite）
+    urls: 源图片 url -> ETag / Last-Modified / sha256
+    media: 图片内容 sha256 -> WordPress media id / source_url
+    """
+
+    def __init__(self, path='./data/media.db'):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.lock = threading.Lock()
+        # 本次运行中已经验证过的 url，不再发条件请求
+        self.fresh = set()
+        # 同一 url 同时只允许一个线程下载/上传
+        self.url_locks = {}
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS urls ('
+            'url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, sha256 TEXT, updated_at REAL)'
+        )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS media ('
+            'sha256 TEXT PRIMARY KEY, media_id INTEGER, source_url TEXT, updated_at REAL)'
+        )
+        self.conn.commit()
+
+    def lookup_url(self, url):
+        """返回 {'etag', 'last_modified', 'sha256', 'media'}，media 为 (id, source_url) 或 None"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT u.etag, u.last_modified, u.sha256, m.media_id, m.source_url FROM urls u '
+                'LEFT JOIN media m ON m.sha256 = u.sha256 WHERE u.url = ?',
+                (url,),
+            ).fetchone()
+
+        if not row:
+            return None
+
+        return {
+            'etag': row[0],
+            'last_modified': row[1],
+            'sha256': row[2],
+            'media': (row[3], row[4]) if row[3] else None,
+        }
+
+    def lookup_sha(self, sha256):
+        with self.lock:
+            row = self.conn.execute('SELECT media_id, source_url FROM media WHERE sha256 = ?', (sha256,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put_url(self, url, sha256, etag=None, last_modified=None):
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO urls (url, etag, last_modified, sha256, updated_at) VALUES (?, ?, ?, ?, ?)',
+                (url, etag, last_modified, sha256, time.time()),
+            )
+            self.conn.commit()
+            self.fresh.add(url)
+
+    def put_media(self, sha256, media_id, source_url):
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO media (sha256, media_id, source_url, updated_at) VALUES (?, ?, ?, ?)',
+                (sha256, media_id, source_url, time.time()),
+            )
+            self.conn.commit()
+
+    def url_lock(self, url):
+        with self.lock:
+            if url not in self.url_locks:
+                self.url_locks[url] = threading.Lock()
+            return self.url_locks[url]
+
+    def is_fresh(self, url):
+        with self.lock:
+            return url in self.fresh
+
+    def mark_fresh(self, url):
+        with self.lock:
+            self.fresh.add(url)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,118 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+import retry_policy
+from metrics import METRICS
+
+
+class MediaQueue:
+    """
+    图片和文章分开处理：文章先发布，图片在自己的线程池里下载上传，
+    上传成功后再把 featured_media 和 structure_pic 补到文章上，
+    失败的图片过一段时间重试，不会让整个产品失败
+    """
+
+    def __init__(self, api, workers=2, tries=3):
+        self.api = api
+        self.tries = max(int(tries), 1)
+        self.pool = ThreadPoolExecutor(max_workers=max(int(workers), 1), thread_name_prefix='media')
+        self.cond = threading.Condition()
+        self.pending = 0
+
+    def attach(self, article_id, images, title, publish=False, then=None):
+        """
+        :param images: {'featured_media': 图片url, 'structure_pic': 图片url}
+        :param publish: 文章是草稿，全部图片补上后改为发布
+        :param then: 完成回调 then(media)，media 为补上的图片 {字段: (media id, source_url)}
+        """
+        job = {'article_id': article_id, 'images': dict(images), 'title': title, 'publish': publish,
+               'then': then, 'media': {}, 'uploaded': {}, 'attempt': 0}
+        with self.cond:
+            self.pending += 1
+        self.pool.submit(self.run, job)
+
+    def run(self, job):
+        try:
+            self.transfer(job)
+        except Exception as e:
+            logger.error(f'Pictures of article {job["article_id"]} failed: {e}')
+            self.finish(job)
+
+    def transfer(self, job):
+        """
+        传一轮还没成功的图片，上传成功的补到文章上，补上之后才从 job['images'] 去掉，
+        上传了但没补上的保留 media id，下一轮只重新补，剩下的稍后重试
+        """
+        delay = None
+        for field, url in list(job['images'].items()):
+            if field in job['uploaded']:
+                continue
+            try:
+                media = self.api.upload_picture(url, job['title'])
+            except retry_policy.CircuitOpenError as e:
+                delay = max(delay or 0, e.retry_in)
+                continue
+            except Exception as e:
+                logger.error(f'Upload {url} failed: {e}')
+                continue
+
+            if media[0]:
+                job['uploaded'][field] = media
+
+        job['attempt'] += 1
+        if not job['uploaded']:
+            return self.retry(job, delay)
+
+        uploaded = dict(job['uploaded'])
+        fields = {field: media[0] for field, media in uploaded.items()}
+        if job['publish'] and len(uploaded) == len(job['images']):
+            fields['status'] = 'publish'
+
+        def patched(ok):
+            if ok:
+                job['media'].update(uploaded)
+                for field in uploaded:
+                    del job['images'][field]
+                    del job['uploaded'][field]
+                METRICS.count('media_attached', len(uploaded))
+            else:
+                logger.error(f'Attach pictures to article {job["article_id"]} failed')
+            return self.retry(job, delay)
+
+        self.api.update_article(job['article_id'], fields=fields, then=patched)
+
+    def retry(self, job, delay):
+        """还有没补上的图片时稍后再来一轮，次数用完就放弃"""
+        if not job['images'] or job['attempt'] >= self.tries:
+            return self.finish(job)
+
+        METRICS.count('media_retried')
+        delay = delay if delay is not None else self.api.policy.backoff(job['attempt'])
+        logger.warning(f'{len(job["images"])} pictures of {job["title"]} failed, retry in {delay:.0f}s')
+        self.later(job, delay)
+
+    def later(self, job, delay):
+        timer = threading.Timer(delay, self.pool.submit, (self.run, job))
+        timer.daemon = True
+        timer.start()
+
+    def finish(self, job):
+        try:
+            if job['images']:
+                METRICS.count('media_failed', len(job['images']))
+                logger.error(f'Give up pictures of article {job["article_id"]}: {", ".join(job["images"].values())}')
+
+            if job['then']:
+                job['then'](job['media'])
+        finally:
+            with self.cond:
+                self.pending -= 1
+                self.cond.notify_all()
+
+    def wait(self):
+        """等待所有图片上传并补到文章上，包括等待重试的"""
+        with self.cond:
+            while self.pending > 0:
+                self.cond.wait()
@@ -0,0 +1,157 @@
+import bisect
+import json
+import os
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+
+# 延迟直方图的桶（秒）
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf'))
+
+
+def host_of(url):
+    return urllib.parse.urlsplit(url).netloc if url else ''
+
+
+class Stat:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.bytes = 0
+        self.buckets = [0] * len(BUCKETS)
+
+    def observe(self, seconds, ok=True):
+        self.count += 1
+        self.errors += not ok
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def quantile(self, q):
+        """按直方图估算分位数（取桶的上界）"""
+        if not self.count:
+            return 0.0
+        target, seen = q * self.count, 0
+        for bound, n in zip(BUCKETS, self.buckets):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:
+    """按 (阶段, host) 统计耗时、次数、失败和流量，线程安全"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """清空统计，常驻进程每个任务开始时调用"""
+        with self.lock:
+            self.stats = {}
+            self.counters = {}
+            self.started = time.monotonic()
+
+    def stat(self, stage, host):
+        key = (stage, host)
+        if key not in self.stats:
+            self.stats[key] = Stat()
+        return self.stats[key]
+
+    def observe(self, stage, host, seconds, ok=True):
+        with self.lock:
+            self.stat(stage, host).observe(seconds, ok)
+
+    def add_bytes(self, stage, host, n):
+        with self.lock:
+            self.stat(stage, host).bytes += n
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def timer(self, stage, host=''):
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.observe(stage, host, time.perf_counter() - start, ok)
+
+    def summary(self):
+        """文字表格：每个阶段/host 的次数、失败、延迟和流量"""
+        with self.lock:
+            items = sorted(self.stats.items())
+            counters = dict(self.counters)
+
+        header = f'{"stage":<16}{"host":<28}{"count":>7}{"errors":>7}{"p50":>8}{"p90":>8}{"max":>8}{"total":>9}{"MB":>9}'
+        lines = [header, '-' * len(header)]
+        for (stage, host), s in items:
+            lines.append(f'{stage:<16}{host[:27]:<28}{s.count:>7}{s.errors:>7}{s.quantile(0.5):>8.2f}'
+                         f'{s.quantile(0.9):>8.2f}{s.max:>8.2f}{s.total:>9.1f}{s.bytes / 1048576:>9.2f}')
+
+        lines.append(f'elapsed {time.monotonic() - self.started:.1f}s ' +
+                     ' '.join(f'{k}={v}' for k, v in sorted(counters.items())))
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'elapsed': time.monotonic() - self.started,
+                'counters': dict(self.counters),
+                'stages': [
+                    {
+                        'stage': stage, 'host': host, 'count': s.count, 'errors': s.errors,
+                        'seconds': s.total, 'max': s.max, 'bytes': s.bytes,
+                        'buckets': dict(zip([str(b) for b in BUCKETS], s.buckets)),
+                    }
+                    for (stage, host), s in sorted(self.stats.items())
+                ],
+            }
+
+    def to_prometheus(self):
+        """Prometheus textfile 格式"""
+        data = self.to_dict()
+        lines = [
+            '# TYPE scrape_stage_seconds histogram',
+        ]
+        for s in data['stages']:
+            labels = f'stage="{s["stage"]}",host="{s["host"]}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS, s['buckets'].values()):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else bound
+                lines.append(f'scrape_stage_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'scrape_stage_seconds_sum{{{labels}}} {s["seconds"]}')
+            lines.append(f'scrape_stage_seconds_count{{{labels}}} {s["count"]}')
+
+        lines.append('# TYPE scrape_stage_errors_total counter')
+        lines += [f'scrape_stage_errors_total{{stage="{s["stage"]}",host="{s["host"]}"}} {s["errors"]}' for s in data['stages']]
+        lines.append('# TYPE scrape_stage_bytes_total counter')
+        lines += [f'scrape_stage_bytes_total{{stage="{s["stage"]}",host="{s["host"]}"}} {s["bytes"]}' for s in data['stages']]
+        lines.append('# TYPE scrape_events_total counter')
+        lines += [f'scrape_events_total{{event="{k}"}} {v}' for k, v in sorted(data['counters'].items())]
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path):
+        """.prom 输出 Prometheus textfile，其余输出 json"""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            if path.endswith('.prom'):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp, path)
+
+
+# 全局统计
+METRICS = Metrics()
@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+
+
+class PageCache:
+    """
+    页面缓存（SQLite），正文 zlib 压缩后保存，带 ETag / Last-Modified
+    ttl 秒内直接用缓存，过期后发条件请求；总大小超过 max_bytes 时按最近使用时间淘汰
+    """
+
+    def __init__(self, path='./data/pages.db', ttl=12 * 3600, max_bytes=512 * 1024 * 1024, offline=False):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # 只从缓存读取，不访问网络
+        self.offline = offline
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            'url TEXT PRIMARY KEY, body BLOB, size INTEGER, etag TEXT, last_modified TEXT, '
+            'fetched_at REAL, used_at REAL, encoding TEXT)'
+        )
+        # 旧版本的缓存没有 encoding（响应头声明的 charset）
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(pages)')]
+        if 'encoding' not in columns:
+            self.conn.execute('ALTER TABLE pages ADD COLUMN encoding TEXT')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS pages_used_at ON pages (used_at)')
+        self.conn.commit()
+        self.total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+
+    def get(self, url):
+        """返回 {'content', 'etag', 'last_modified', 'fresh', 'encoding'}，没有缓存返回 None"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT body, etag, last_modified, fetched_at, encoding FROM pages WHERE url = ?', (url,)
+            ).fetchone()
+            if not row:
+                return None
+
+            self.conn.execute('UPDATE pages SET used_at = ? WHERE url = ?', (time.time(), url))
+            self.conn.commit()
+
+        return {
+            'content': zlib.decompress(row[0]),
+            'etag': row[1],
+            'last_modified': row[2],
+            'fresh': time.time() - row[3] < self.ttl,
+            'encoding': row[4],
+        }
+
+    def put(self, url, content, etag=None, last_modified=None, encoding=None):
+        body = zlib.compress(content)
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute('SELECT size FROM pages WHERE url = ?', (url,)).fetchone()
+            self.conn.execute(
+                'INSERT OR REPLACE INTO pages (url, body, size, etag, last_modified, fetched_at, used_at, encoding) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, body, len(body), etag, last_modified, now, now, encoding),
+            )
+            self.total += len(body) - (old[0] if old else 0)
+            self.evict()
+            self.conn.commit()
+
+    def touch(self, url):
+        """304 后更新验证时间"""
+        with self.lock:
+            self.conn.execute('UPDATE pages SET fetched_at = ? WHERE url = ?', (time.time(), url))
+            self.conn.commit()
+
+    def evict(self):
+        """调用方持有 self.lock，淘汰最久没用的页面，直到总大小降到 max_bytes 的 90%"""
+        if self.total <= self.max_bytes:
+            return
+
+        target = self.max_bytes * 0.9
+        for url, size in self.conn.execute('SELECT url, size FROM pages ORDER BY used_at').fetchall():
+            if self.total <= target:
+                break
+            self.conn.execute('DELETE FROM pages WHERE url = ?', (url,))
+            self.total -= size
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def cached_response(url, content, status_code=200, encoding=None):
+    """用缓存内容构造一个 requests.Response，encoding 是原响应头声明的 charset"""
+    r = requests.Response()
+    r.url = url
+    r.status_code = status_code
+    r._content = content
+    r.encoding = encoding or 'utf-8'
+    if encoding:
+        r.headers['content-type'] = f'text/html; charset={encoding}'
+    return r
@@ -0,0 +1,168 @@
+import re
+
+import lxml.html
+from cssselect import HTMLTranslator
+from lxml import etree
+
+import spec_table
+
+CATEGORY_NAV = 'div.nav-title > .layui-breadcrumb'
+CATEGORY_GROUP = 'div.boxT > .posit-box'
+GROUP_NAME = 'h2 > a'
+GROUP_PRODUCT = 'div.hang > a'
+PRODUCT_ID = 'div.Product'
+
+DETAIL_ID = 'cite'
+DETAIL_SMALL_IMG = 'div.layui-col-md3.detail-img-box > img'
+DETAIL_BIG_IMG = 'div#magnifier img'
+DETAIL_PRICE = 'div.detail-img-box > div > div > span'
+DETAIL_TABLE = 'div.layui-row > div.layui-col-md4 > div.layui-col-md9 > table'
+
+# <meta charset=..> 或 <meta http-equiv="content-type" content="..; charset=..">
+RE_META_CHARSET = re.compile(rb'<meta[^>]+charset', re.IGNORECASE)
+
+
+def response_encoding(r):
+    """HTTP 响应头里声明的 charset，没有声明返回 None（requests 这时默认的 ISO-8859-1 不算）"""
+    if 'charset' in r.headers.get('content-type', '').lower():
+        return r.encoding
+    return None
+
+
+def document_encoding(content, encoding=None):
+    """
+    解码页面用的编码：响应头声明的 charset 优先；没有时页面里有 <meta charset> 就返回 None 交给解析器，
+    都没有按 utf-8（lxml 默认会当作 latin-1）
+    """
+    if encoding:
+        return encoding
+    if RE_META_CHARSET.search(content[:4096]):
+        return None
+    return 'utf-8'
+
+
+class SoupParser:
+    """BeautifulSoup 解析（原来的实现）"""
+    name = 'soup'
+
+    def __init__(self):
+        # 只有选了这个解析器才导入 bs4
+        from bs4 import BeautifulSoup
+        self.soup = BeautifulSoup
+
+    def parse_category(self, content, encoding=None):
+        """
+        解析分类页
+        :param encoding: 响应头声明的 charset，见 response_encoding
+        :return: {'categories': [{'level1': .., 'level2': ..}], 'groups': [{'name': level3, 'products': [..]}]}
+        """
+        soup = self.soup(content, 'lxml', from_encoding=document_encoding(content, encoding))
+
+        categories = []
+        for nav in soup.select(CATEGORY_NAV):
+            nav_items = nav.select('a')
+            categories.append({'level1': nav_items[1].text, 'level2': nav_items[2].text})
+
+        groups = []
+        for sub_list in soup.select(CATEGORY_GROUP):
+            products = []
+            for a in sub_list.select(GROUP_PRODUCT):
+                product = a.select_one(PRODUCT_ID)
+                products.append({'product_id': product.text if product else '', 'href': a.get('href', '')})
+
+            groups.append({'name': sub_list.select_one(GROUP_NAME).text.strip(), 'products': products})
+
+        return {'categories': categories, 'groups': groups}
+
+    def parse_product(self, content, encoding=None):
+        """
+        解析产品页
+        :return: {'product_id', 'small_img', 'big_img', 'price', 'table'}，图片为相对路径，table 为 SpecTable
+        """
+        soup = self.soup(content, 'lxml', from_encoding=document_encoding(content, encoding))
+
+        return {
+            'product_id': soup.select_one(DETAIL_ID).text,
+            'small_img': soup.select_one(DETAIL_SMALL_IMG)['src'],
+            'big_img': soup.select_one(DETAIL_BIG_IMG)['src'],
+            'price': soup.select_one(DETAIL_PRICE).text,
+            'table': spec_table.SpecTable.from_html(str(soup.select_one(DETAIL_TABLE))),
+        }
+
+
+def compile_css(css, relative=False):
+    """css selector 预编译成 XPath"""
+    prefix = './/' if relative else 'descendant-or-self::'
+    return etree.XPath(HTMLTranslator().css_to_xpath(css, prefix=prefix))
+
+
+class LxmlParser:
+    """lxml.html 单次解析 + 预编译 XPath，比 BeautifulSoup 快很多"""
+    name = 'lxml'
+
+    category_nav = compile_css(CATEGORY_NAV)
+    category_group = compile_css(CATEGORY_GROUP)
+    nav_links = etree.XPath('.//a')
+    group_name = compile_css(GROUP_NAME, relative=True)
+    group_product = compile_css(GROUP_PRODUCT, relative=True)
+    product_id = compile_css(PRODUCT_ID, relative=True)
+
+    detail_id = compile_css(DETAIL_ID)
+    detail_small_img = compile_css(DETAIL_SMALL_IMG)
+    detail_big_img = compile_css(DETAIL_BIG_IMG)
+    detail_price = compile_css(DETAIL_PRICE)
+    detail_table = compile_css(DETAIL_TABLE)
+
+    @staticmethod
+    def first(xpath, node):
+        found = xpath(node)
+        if not found:
+            raise ValueError(f'{xpath.path} not found')
+        return found[0]
+
+    @staticmethod
+    def document(content, encoding=None):
+        encoding = document_encoding(content, encoding)
+        return lxml.html.fromstring(content, parser=lxml.html.HTMLParser(encoding=encoding) if encoding else None)
+
+    def parse_category(self, content, encoding=None):
+        doc = self.document(content, encoding)
+
+        categories = []
+        for nav in self.category_nav(doc):
+            nav_items = self.nav_links(nav)
+            categories.append({'level1': nav_items[1].text_content(), 'level2': nav_items[2].text_content()})
+
+        groups = []
+        for sub_list in self.category_group(doc):
+            products = []
+            for a in self.group_product(sub_list):
+                product = self.product_id(a)
+                products.append({'product_id': product[0].text_content() if product else '', 'href': a.get('href', '')})
+
+            groups.append({'name': self.first(self.group_name, sub_list).text_content().strip(), 'products': products})
+
+        return {'categories': categories, 'groups': groups}
+
+    def parse_product(self, content, encoding=None):
+        doc = self.document(content, encoding)
+
+        return {
+            'product_id': self.first(self.detail_id, doc).text_content(),
+            'small_img': self.first(self.detail_small_img, doc).get('src'),
+            'big_img': self.first(self.detail_big_img, doc).get('src'),
+            'price': self.first(self.detail_price, doc).text_content(),
+            'table': spec_table.SpecTable.from_element(self.first(self.detail_table, doc)),
+        }
+
+
+PARSERS = {
+    'lxml': LxmlParser,
+    'soup': SoupParser,
+}
+
+
+def get_parser(name='lxml'):
+    if name not in PARSERS:
+        raise ValueError(f'Unknown parser {name}, choose from {", ".join(PARSERS)}')
+    return PARSERS[name]()
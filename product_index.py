@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# 增量同步比较的字段
+SYNC_FIELDS = ('title', 'price', 'table1', 'table2', 'size', 'small_pic_url', 'big_pic_url')
+
+
+def content_hash(*parts):
+    """对抓取内容计算 sha256，用于判断内容是否变化"""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode('utf-8'))
+        h.update(b'\x00')
+    return h.hexdigest()
+
+
+def normalize(value):
+    """合并空白，只是格式变化时不算内容变化"""
+    return ' '.join(str(value if value is not None else '').split())
+
+
+def field_hashes(payload):
+    """每个同步字段单独计算 hash，{field: sha256}"""
+    return {k: content_hash(normalize(payload.get(k))) for k in SYNC_FIELDS}
+
+
+def payload_hash(hashes):
+    """整个 payload 的 hash"""
+    return content_hash(*(hashes.get(k) for k in SYNC_FIELDS))
+
+
+class ProductIndex:
+    """本地 product_id 索引（SQLite），记录已发布文章，避免重复询问 WordPress"""
+
+    def __init__(self, path='./data/products.db'):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS products ('
+            'product_id TEXT PRIMARY KEY, '
+            'article_id INTEGER, '
+            'cat_ids TEXT, '
+            'media_ids TEXT, '
+            'content_hash TEXT, '
+            'field_hashes TEXT, '
+            'updated_at REAL)'
+        )
+
+        # 旧版本的索引没有 field_hashes
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(products)')]
+        if 'field_hashes' not in columns:
+            self.conn.execute('ALTER TABLE products ADD COLUMN field_hashes TEXT')
+        self.conn.commit()
+
+    def get(self, product_id):
+        """返回 {'article_id', 'cat_ids', 'media_ids', 'content_hash', 'field_hashes'}，不存在返回 None"""
+        return self.get_many([product_id]).get(product_id)
+
+    def get_many(self, product_ids):
+        result = {}
+        product_ids = list(product_ids)
+        with self.lock:
+            for i in range(0, len(product_ids), 500):
+                batch = product_ids[i:i + 500]
+                rows = self.conn.execute(
+                    f'SELECT product_id, article_id, cat_ids, media_ids, content_hash, field_hashes FROM products '
+                    f'WHERE product_id IN ({",".join("?" * len(batch))})',
+                    batch,
+                ).fetchall()
+                for row in rows:
+                    result[row[0]] = {
+                        'article_id': row[1],
+                        'cat_ids': set(json.loads(row[2] or '[]')),
+                        'media_ids': json.loads(row[3] or '[]'),
+                        'content_hash': row[4],
+                        'field_hashes': json.loads(row[5] or '{}'),
+                    }
+        return result
+
+    def put(self, product_id, article_id, cat_ids, media_ids=None, content_hash=None, hashes=None):
+        """写入或更新一条记录，media_ids/content_hash/hashes 为 None 时保留原值"""
+        with self.lock:
+            self.conn.execute(
+                'INSERT INTO products (product_id, article_id, cat_ids, media_ids, content_hash, field_hashes, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(product_id) DO UPDATE SET '
+                'article_id = excluded.article_id, '
+                'cat_ids = excluded.cat_ids, '
+                'media_ids = COALESCE(excluded.media_ids, products.media_ids), '
+                'content_hash = COALESCE(excluded.content_hash, products.content_hash), '
+                'field_hashes = COALESCE(excluded.field_hashes, products.field_hashes), '
+                'updated_at = excluded.updated_at',
+                (
+                    product_id,
+                    article_id,
+                    json.dumps(sorted(cat_ids)),
+                    json.dumps(list(media_ids)) if media_ids is not None else None,
+                    content_hash,
+                    json.dumps(hashes, sort_keys=True) if hashes is not None else None,
+                    time.time(),
+                ),
+            )
+            self.conn.commit()
+
+    def update_categories(self, product_id, cat_ids):
+        with self.lock:
+            self.conn.execute(
+                'UPDATE products SET cat_ids = ?, updated_at = ? WHERE product_id = ?',
+                (json.dumps(sorted(cat_ids)), time.time(), product_id),
+            )
+            self.conn.commit()
+
+    def remove_article(self, article_id):
+        """文章在 WordPress 里被删除了，去掉指向它的记录"""
+        with self.lock:
+            self.conn.execute('DELETE FROM products WHERE article_id = ?', (article_id,))
+            self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute('DELETE FROM products')
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -1,91 +1,211 @@
 import re
+import atexit
+import collections
 import datetime
+import threading
 import time
 
-client = boto3.client('logs')
+import boto3
+
+# CloudWatch put_log_events 的限制
+MAX_BATCH_COUNT = 10000
+MAX_BATCH_BYTES = 1048576
+EVENT_OVERHEAD = 26  # 每条日志额外计算的字节数
+
+client = None
 
 log_group_name = 'auctionScraper'
 log_stream_name = datetime.datetime.now().strftime('%Y-%m-%d %H_%M_%S')
-seq_token = None
 
 
-def init_stream():
+def get_client():
+    global client
+    if client is None:
+        client = boto3.client('logs')
+    return client
+
+
+def init_stream(logs_client=None, group_name=None, stream_name=None):
     # create steam on cloudWatch by time str
-    global log_stream_name
-    global log_group_name
+    logs_client = logs_client or get_client()
+    group_name = group_name or log_group_name
+    stream_name = stream_name or log_stream_name
 
     for i in range(30):
-        print(f"Creating Stream: {log_stream_name} on CloudWatch")
+        print(f"Creating Stream: {stream_name} on CloudWatch")
 
         time.sleep(2)
 
         try:
-            response = client.create_log_stream(
-                logGroupName=log_group_name,
-                logStreamName=log_stream_name
+            response = logs_client.create_log_stream(
+                logGroupName=group_name,
+                logStreamName=stream_name
             )
             if response['ResponseMetadata']['HTTPStatusCode'] == 200:
-                print(f"Creating Stream: {log_stream_name} Succeed")
+                print(f"Creating Stream: {stream_name} Succeed")
                 return True
             else:
-                print(f"Creating Stream: {log_stream_name} Failed, Status {response['ResponseMetadata']['HTTPStatusCode']}")
+                print(f"Creating Stream: {stream_name} Failed, Status {response['ResponseMetadata']['HTTPStatusCode']}")
 
         except Exception as e:
+            if 'ResourceAlreadyExistsException' in type(e).__name__:
+                return True
             print(f"Create Stream err: {e}")
 
     # Create unsuccessful
     exit(-1)
 
 
-def handler(log):
-    # response = client.get_log_events(
-    #     logGroupName='auctionScraper',
-    #     logStreamName='ApplicationLogs',
-    #     limit=1,
-    # )
-    #
-    # print(response)
-
-    global seq_token
-    global log_stream_name
-    global log_group_name
-
-    try:
+def expected_token(e):
+    """从异常里拿到 CloudWatch 期望的 sequenceToken"""
+    response = getattr(e, 'response', None) or {}
+    if response.get('expectedSequenceToken'):
+        return response['expectedSequenceToken']
+
+    hit = re.search(r'sequenceToken(?: is)?: (\w+)', str(e))
+    return hit.group(1) if hit and hit.group(1) != 'null' else None
+
+
+class CloudWatchSink:
+    """
+    loguru sink：日志先放进缓冲区，后台线程按批发送到 CloudWatch
+    满 10000 条、满 1 MB 或者到了 interval 秒就发送一次
+
+    logger.add(CloudWatchSink(), level="WARNING", format='{message}')
+    """
+
+    def __init__(self, logs_client=None, group_name=None, stream_name=None, interval=5.0, create_stream=True):
+        self.client = logs_client or get_client()
+        self.group_name = group_name or log_group_name
+        self.stream_name = stream_name or log_stream_name
+        self.interval = interval
+        self.seq_token = None
+
+        self.buffer = collections.deque()
+        self.buffer_bytes = 0
+        self.cond = threading.Condition()
+        self.send_lock = threading.Lock()  # sequenceToken 要求一批一批按顺序发送
+        self.stopped = False
+
+        if create_stream:
+            init_stream(self.client, self.group_name, self.stream_name)
+
+        self.thread = threading.Thread(target=self.loop, name='cloudwatch-sink', daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def write(self, message):
+        """loguru 调用，只放进缓冲区"""
+        record = getattr(message, 'record', None)
+        timestamp = int(record['time'].timestamp() * 1000) if record else int(round(time.time() * 1000))
+        text = str(message).rstrip('\n')
+        size = len(text.encode('utf-8')) + EVENT_OVERHEAD
+
+        with self.cond:
+            self.buffer.append({'timestamp': timestamp, 'message': text})
+            self.buffer_bytes += size
+            if len(self.buffer) >= MAX_BATCH_COUNT or self.buffer_bytes >= MAX_BATCH_BYTES:
+                self.cond.notify()
+
+    def take_batch(self):
+        """从缓冲区取出一批不超过限制的日志"""
+        batch, size = [], 0
+        while self.buffer and len(batch) < MAX_BATCH_COUNT:
+            event_size = len(self.buffer[0]['message'].encode('utf-8')) + EVENT_OVERHEAD
+            if batch and size + event_size > MAX_BATCH_BYTES:
+                break
+            batch.append(self.buffer.popleft())
+            size += event_size
+
+        self.buffer_bytes -= size
+        return batch
+
+    def loop(self):
+        while True:
+            with self.cond:
+                if not self.stopped and len(self.buffer) < MAX_BATCH_COUNT and self.buffer_bytes < MAX_BATCH_BYTES:
+                    self.cond.wait(self.interval)
+
+                stopped = self.stopped
+                batches = []
+                while self.buffer:
+                    batches.append(self.take_batch())
+
+            for events in batches:
+                self.send(events)
+
+            if stopped:
+                return
+
+    def send(self, events):
+        """发送一批日志，sequenceToken 不对时按返回的 token 重试"""
+        # 同一批日志必须按时间排序
+        events.sort(key=lambda x: x['timestamp'])
+
+        with self.send_lock:
+            return self.put_events(events)
+
+    def put_events(self, events):
         for i in range(3):
             log_event = {
-                'logGroupName': log_group_name,
-                'logStreamName': log_stream_name,
-                'logEvents': [
-                    {
-                        'timestamp': int(round(time.time() * 1000)),
-                        'message': log
-                    },
-                ],
+                'logGroupName': self.group_name,
+                'logStreamName': self.stream_name,
+                'logEvents': events,
             }
 
-            if seq_token:
-                log_event['sequenceToken'] = seq_token
+            if self.seq_token:
+                log_event['sequenceToken'] = self.seq_token
 
             try:
-                client.put_log_events(**log_event)
+                response = self.client.put_log_events(**log_event)
+                self.seq_token = response.get('nextSequenceToken')
+                return True
 
-                # Put log to cloudWatch Succeed
-                break
+            except Exception as e:
+                name = type(e).__name__
+                if name == 'InvalidSequenceTokenException':
+                    self.seq_token = expected_token(e)
+                elif name == 'DataAlreadyAcceptedException':
+                    # 这一批之前已经发送成功
+                    self.seq_token = expected_token(e)
+                    return True
+                else:
+                    print(f"Put log events err: {e}")
+                    time.sleep(1)
 
-            except client.exceptions.InvalidSequenceTokenException as e:
-                if 'The given sequenceToken is invalid' in str(e):
-                    seq_token = re.search(r'The next expected sequenceToken is: (\d+)$', str(e)).group(1)
+        return False
 
-            except client.exceptions.DataAlreadyAcceptedException as e:
-                if 'The given sequenceToken is invalid' in str(e):
-                    seq_token = re.search(r'The next expected sequenceToken is: (\d+)$', str(e)).group(1)
+    def drain(self):
+        """立即发送缓冲区里的日志（不叫 flush，否则 loguru 每条日志都会调用）"""
+        with self.cond:
+            batches = []
+            while self.buffer:
+                batches.append(self.take_batch())
 
-    except Exception as e:
-        print(f"----------------------- {e}")
+        for events in batches:
+            self.send(events)
 
-    # print(response)
+    def stop(self):
+        with self.cond:
+            if self.stopped:
+                return
+            self.stopped = True
+            self.cond.notify()
+        self.thread.join()
+
+
+default_sink = None
+
+
+def handler(log):
+    """兼容原来的调用方式，日志交给默认 sink 批量发送"""
+    global default_sink
+    if default_sink is None:
+        default_sink = CloudWatchSink(create_stream=False)
+    default_sink.write(log)
 
 
 if __name__ == '__main__':
     init_stream()
-    handler('nihao')
\ No newline at end of file
+    handler('nihao')
+    default_sink.stop()
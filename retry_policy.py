@@ -0,0 +1,158 @@
+import email.utils
+import random
+import threading
+import time
+
+import requests
+from loguru import logger
+
+import metrics
+from metrics import METRICS
+
+# 这些状态码说明服务器暂时不可用，可以重试
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# 非幂等请求（创建文章、上传图片）只在服务器明确没有处理时重试
+SAFE_STATUS = (429, 503)
+
+
+class CircuitOpenError(Exception):
+    """host 连续失败，熔断中"""
+
+    def __init__(self, host, retry_in):
+        super().__init__(f'Circuit open for {host}, retry in {retry_in:.0f}s')
+        self.host = host
+        self.retry_in = retry_in
+
+
+class HostState:
+    def __init__(self):
+        self.failures = 0
+        self.open_until = 0.0
+        self.trial = False  # 半开状态，只放一个请求去试
+
+
+class RetryPolicy:
+    """
+    按 host 统一的重试和熔断：
+    带抖动的指数退避，遵守 Retry-After，非幂等请求只在安全的情况下重试，
+    同一 host 连续失败 threshold 次后熔断 cooldown 秒，期间直接失败
+    """
+
+    def __init__(self, tries=4, base_delay=1.0, max_delay=30.0, threshold=5, cooldown=60.0):
+        self.tries = max(int(tries), 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.hosts = {}
+
+    def state(self, host):
+        if host not in self.hosts:
+            self.hosts[host] = HostState()
+        return self.hosts[host]
+
+    def before(self, host):
+        """熔断中直接抛 CircuitOpenError，返回这次请求是不是半开试探"""
+        with self.lock:
+            s = self.state(host)
+            now = time.monotonic()
+            if s.open_until > now:
+                raise CircuitOpenError(host, s.open_until - now)
+
+            if s.open_until and not s.trial:
+                # 冷却结束，放一个请求试探
+                s.trial = True
+                return True
+            elif s.open_until:
+                raise CircuitOpenError(host, self.cooldown)
+            return False
+
+    def release(self, host):
+        """试探请求没有得出结果（比如 fn 里解析出错），结束半开状态，下一个请求再试"""
+        with self.lock:
+            self.state(host).trial = False
+
+    def success(self, host):
+        with self.lock:
+            s = self.state(host)
+            s.failures = 0
+            s.open_until = 0.0
+            s.trial = False
+
+    def failure(self, host):
+        with self.lock:
+            s = self.state(host)
+            s.failures += 1
+            if s.trial or s.failures >= self.threshold:
+                if not s.open_until or s.trial:
+                    logger.warning(f'Circuit open for {host}: {s.failures} failures')
+                s.open_until = time.monotonic() + self.cooldown
+                s.trial = False
+                METRICS.count('circuit_open')
+
+    def retry_in(self, host):
+        """熔断剩余时间，没有熔断为 0"""
+        with self.lock:
+            return max(self.state(host).open_until - time.monotonic(), 0.0)
+
+    def backoff(self, attempt, response=None):
+        """Retry-After 优先，否则 full jitter 指数退避"""
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_delay)
+            except ValueError:
+                try:
+                    when = email.utils.parsedate_to_datetime(retry_after).timestamp()
+                    return min(max(when - time.time(), 0.0), self.max_delay)
+                except (TypeError, ValueError):
+                    pass
+
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, stage, url, fn, idempotent=True):
+        """
+        执行一次请求 fn()，按策略重试，每次尝试都记录到 METRICS
+        重试完仍是错误状态码时返回最后的 response，由调用方处理
+        """
+        host = metrics.host_of(url)
+
+        for attempt in range(self.tries):
+            trial = self.before(host)
+            try:
+                start = time.perf_counter()
+                try:
+                    r = fn()
+                except requests.exceptions.RequestException as e:
+                    METRICS.observe(stage, host, time.perf_counter() - start, ok=False)
+                    self.failure(host)
+
+                    # 连接都没建立，服务器肯定没处理，非幂等请求也可以重试
+                    safe = idempotent or isinstance(e, requests.exceptions.ConnectTimeout)
+                    if not safe or attempt == self.tries - 1:
+                        raise
+
+                    delay = self.backoff(attempt)
+                    logger.debug(f'{stage} {url} failed: {e}, retry in {delay:.1f}s')
+                    time.sleep(delay)
+                    continue
+
+                failed = r.status_code in RETRY_STATUS
+                METRICS.observe(stage, host, time.perf_counter() - start, ok=not failed)
+
+                if not failed:
+                    self.success(host)
+                    return r
+
+                self.failure(host)
+                if attempt == self.tries - 1 or not (idempotent or r.status_code in SAFE_STATUS):
+                    return r
+
+                delay = self.backoff(attempt, r)
+                logger.debug(f'{stage} {url} got {r.status_code}, retry in {delay:.1f}s')
+                r.close()
+                time.sleep(delay)
+            finally:
+                if trial:
+                    self.release(host)
@@ -0,0 +1,133 @@
+import collections
+import threading
+import time
+
+from loguru import logger
+
+
+class Scheduler:
+    """
+    共享的工作线程池：每个分类一个队列，线程轮流从各分类取任务，
+    多个分类同时抓取时不会一个分类占满所有线程
+    """
+
+    def __init__(self, workers=4):
+        self.workers = max(int(workers), 1)
+        self.queues = collections.OrderedDict()
+        self.pending = collections.Counter()
+        self.done = collections.Counter()
+        self.failed = collections.Counter()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.started = time.monotonic()
+
+        self.threads = []
+        for i in range(self.workers):
+            t = threading.Thread(target=self.work, name=f'worker-{i}', daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def submit(self, category, fn, *args, **kwargs):
+        with self.cond:
+            if self.closed:
+                raise RuntimeError('Scheduler is closed')
+
+            self.pending[category] += 1
+            self.enqueue(category, (fn, args, kwargs))
+
+    def submit_later(self, delay, category, fn, *args, **kwargs):
+        """delay 秒后再放进队列，等待期间不占用工作线程，wait() 会等它完成"""
+        with self.cond:
+            if self.closed:
+                raise RuntimeError('Scheduler is closed')
+            self.pending[category] += 1
+
+        def later():
+            with self.cond:
+                self.enqueue(category, (fn, args, kwargs))
+
+        timer = threading.Timer(delay, later)
+        timer.daemon = True
+        timer.start()
+
+    def enqueue(self, category, task):
+        """调用方持有 self.cond"""
+        if category not in self.queues:
+            self.queues[category] = collections.deque()
+        self.queues[category].append(task)
+        self.cond.notify()
+
+    def next_task(self):
+        """轮询各分类队列，取出下一个任务，没有任务时阻塞"""
+        with self.cond:
+            while True:
+                for category in list(self.queues):
+                    queue = self.queues[category]
+                    if queue:
+                        # 取完一个就把这个分类放到最后
+                        self.queues.move_to_end(category)
+                        return category, queue.popleft()
+
+                if self.closed:
+                    return None, None
+                self.cond.wait()
+
+    def work(self):
+        while True:
+            category, task = self.next_task()
+            if task is None:
+                return
+
+            fn, args, kwargs = task
+            ok = True
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                ok = False
+                logger.error(f'Task of {category} failed: {e}')
+
+            with self.cond:
+                self.pending[category] -= 1
+                # 完成数由调用方用 record() 按产品上报，这里只记没有被处理的异常
+                if not ok:
+                    self.failed[category] += 1
+
+                if not self.pending[category]:
+                    self.queues.pop(category, None)
+                self.cond.notify_all()
+
+    def wait(self, category=None):
+        """等待某个分类（None 为全部）的任务完成"""
+        with self.cond:
+            while (self.pending[category] if category is not None else sum(self.pending.values())) > 0:
+                self.cond.wait()
+
+    def record(self, category, done=0, failed=0):
+        """上报完成和最终失败的数量，重新排队的任务执行多次也只算一次"""
+        with self.cond:
+            self.done[category] += done
+            self.failed[category] += failed
+
+    def busy(self, category):
+        """这个分类还有没完成的任务（包括等待重试的）"""
+        with self.cond:
+            return self.pending[category] > 0
+
+    def close(self):
+        self.wait()
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        for t in self.threads:
+            t.join()
+
+    def report(self):
+        """汇总吞吐量"""
+        elapsed = time.monotonic() - self.started
+        with self.cond:
+            done, failed = sum(self.done.values()), sum(self.failed.values())
+            lines = [f'{c}: {self.done[c]} done, {self.failed[c]} failed' for c in sorted(set(self.done) | set(self.failed))]
+
+        lines.append(f'Total: {done} done, {failed} failed in {elapsed:.1f}s, '
+                     f'{(done + failed) / elapsed if elapsed else 0:.2f} products/s')
+        return '\n'.join(lines)
@@ -1,34 +1,168 @@
-import os
+import copy
 import re
 import time
 import wpApi
-import requests
-import pandas
-import urllib.parse
+import limiter
+import page_parser
+import http_pool
+import product_index
+import checkpoint
+import scheduler
+import metrics
+import retry_policy
+import page_cache
+from metrics import METRICS
 
 from loguru import logger
-from retry import retry
-from bs4 import BeautifulSoup
-from lxml import etree
+
+# 修改表格属性名称
+TABLE_CHANGES = [
+    ["System of Measurement", "Size Standards"],
+    ["Ball", "Deep Groove Ball Bearing"],
+    ["For Load Direction", "Load Direction"],
+    ["Construction", "Number of Raceway Ring Rows"],
+    ["Bore Dia", "Inner Dimension d(Ø)"],
+    ["Outer Dia", "Outer Dimension D(Ø)"],
+    ["Width", "Width B"],
+    ["Ring Material", "Inner/Outer Ring Material"],
+]
+
+# 获取 size 时依次尝试的属性名
+SIZE_KEYS = [
+    ['Bore diameter', 'Outside diameter', 'Width'],
+    ['Bore Dia', 'Outer Dia', 'Height'],
+    ['Bore Dia', 'Outer Dia', 'Width'],
+    ['Inside Diameter Of Inner Ring', 'Outside Diameter Of Outer Ring', 'Height Of Overall Bearing Assembly (H)'],
+    ['Roller OD', 'Bore Dia', 'Roller Width'],
+    ['Bore diameter (d)', 'Outside diameter (D)', 'Nominal width'],
+    ['Height M', 'Width W', 'Length L'],
+    ['Maximum length', 'Nominal rail size'],
+    ['Bore Dia', 'Outer Dia', 'Width'],
+    ['Bore Diameter', 'Outside Diameter', 'Width'],
+    ['Bore(d)', 'Cup Outer Diameter(D)', 'Bearing Width(T)'],
+    ['Shoulder diameter of inner ring', 'Permissible axial displacement', 'Diameter of shaft abutment'],
+    ['Bore', 'Outer Diameter', 'Outer Ring Width'],
+    ['b1', 'c1', 'd']
+]
+
+# 失败的产品最多重新排队几次
+MAX_REQUEUE = 3
+
+# 批量查询失败时，这批产品在 exists 里的值，处理时再单个查询
+EXIST_UNKNOWN = 'unknown'
 
 
 class Scrape:
-    def __init__(self, link):
-        self.r = requests.session()
-        self.wp_cls = wpApi.Api()
+    def __init__(self, link, workers=1, per_host=4, rate=1.0, index=None, categories=None, pool_size=10,
+                 media=None, parser='lxml', journal=None, resume=False, scheduler_obj=None, metrics_out=None,
+                 root='https://www.lily-bearing.com/', wp_domain=None, sync=False, pages=None, batch_size=0,
+                 discovery=None, optimizer=None, media_queue=0, media_draft=False, exporter=None):
+        self.r = http_pool.SessionPool(pool_size)
         self.link = link
-        self.root = 'https://www.lily-bearing.com/'
+        self.root = root
+        self.parser = page_parser.get_parser(parser)
+        # 分类页和产品页的本地缓存，None 表示不缓存
+        self.pages = pages
+
+        # 并发设置，workers=1 时按原来的顺序模式运行
+        self.workers = max(int(workers), 1)
+        self.host_limiter = limiter.HostLimiter(per_host)
+        self.bucket = limiter.TokenBucket(rate, capacity=self.workers)
+        self.scheduler = scheduler_obj or (scheduler.Scheduler(self.workers) if self.workers > 1 else None)
+
+        # 所有 host 共用的重试和熔断策略
+        self.policy = retry_policy.RetryPolicy()
+        # 顺序模式下失败的产品，分类抓完后再重试
+        self.deferred = []
+
+        # 本地 product 索引，None 表示每次都询问 WordPress；导出模式下文章 ID 不是 WordPress 的，不用索引
+        self.index = index if exporter is None else None
+        # 增量同步：已存在的产品也抓取产品页，只更新变化的字段
+        self.sync = sync
+        # 增量发现：只处理新出现的和 sitemap lastmod 变化的产品
+        self.discovery = discovery
+        # 重新排队后仍然失败的产品，增量发现下次还会处理
+        self.gave_up = set()
+        # 这次处理过的产品（重新排队的只算一次），用来统计完成数
+        self.handled = set()
+
+        # 进度日志，resume 时跳过已完成的产品并复用中间结果
+        self.journal = journal
+        self.resume = resume
+
+        # run 结束时输出统计，批量模式下由 batch 在最后统一输出
+        self.report_metrics = True
+        self.metrics_out = metrics_out
+
+        # 导出模式：产品写到 WordPress 导入文件（export.Exporter），不调用 REST 接口
+        self.export = exporter
+        # 每个 worker 的两张图片都能同时传输，实际并发由 host_limiter 按 host 限制
+        self.wp_cls = exporter or wpApi.Api(host_limiter=self.host_limiter,
+                                            media_workers=2 * self.workers if self.workers > 1 else 1,
+                                            index=index, categories=categories, pool_size=pool_size, media=media,
+                                            my_domain=wp_domain, policy=self.policy, batch_size=batch_size,
+                                            optimizer=optimizer, media_queue=media_queue, media_draft=media_draft)
+        self.product_api_url = self.wp_cls.my_domain + '/product_Api.php'
+
+    def spawn(self, link):
+        """用同一套连接池、限速、缓存和线程池抓取另一个分类"""
+        obj = copy.copy(self)
+        obj.link = link
+        obj.report_metrics = False
+        obj.deferred = []
+        obj.gave_up = set()
+        obj.handled = set()
+        return obj
 
     def run(self):
         logger.info(f'Scrape category {self.link}')
         # self.link = 'https://www.lily-bearing.com/slewing-ring-bearings/'
-        r = self.fetch(self.link, 30)
+        # 增量发现靠分类页判断新增和消失的产品，每次都要确认是最新的
+        r = self.fetch(self.link, 30, revalidate=self.discovery is not None)
 
         if r.status_code != 200:
             logger.error(f"Fetch {r.url} failed, {r.status_code}")
             return
 
-        self.extract_category(r)
+        if self.journal:
+            self.journal.start(self.link, self.resume)
+
+        previous = self.discovery.snapshot(self.link) if self.discovery else None
+        listing = self.extract_category(r, previous)
+
+        # 批量写入的结果回来后进度日志才完整；发送后才知道失败的产品会重新排队，要再等一轮
+        while True:
+            if self.scheduler:
+                self.scheduler.wait(self.link)
+            else:
+                self.run_deferred()
+
+            self.wp_cls.flush()
+            if not self.deferred and not (self.scheduler and self.scheduler.busy(self.link)):
+                break
+
+        if self.scheduler:
+            failed = len(self.gave_up & self.handled)
+            self.scheduler.record(self.link, done=len(self.handled) - failed, failed=failed)
+
+        if self.discovery and listing is not None:
+            removed = self.discovery.save(self.link, listing, previous, self.gave_up)
+            if removed:
+                METRICS.count('removed', len(removed))
+                logger.warning(f'{len(removed)} products removed from {self.link}: {", ".join(removed[:20])}'
+                               f'{" ..." if len(removed) > 20 else ""}')
+
+        if self.journal:
+            logger.info(f'Checkpoint {self.link}: {self.journal.summary(self.link)}')
+
+        if self.report_metrics:
+            self.report()
+
+    def report(self):
+        """输出各阶段耗时统计，并按需导出"""
+        logger.info(f'Crawl metrics\n{METRICS.summary()}')
+        if self.metrics_out:
+            METRICS.export(self.metrics_out)
 
     def product_exist(self, product_id):
         """
@@ -36,46 +170,118 @@ class Scrape:
         :param product_id:
         :return:
         """
-        url = f'https://products.com/product_Api.php?product_id={product_id}'
-        # url = f'https://products.com/product_Api.php?product_id=SRMS36'
-        r = self.fetch(url, 30)
-        if r.status_code != 200:
-            raise Exception(f"Fetch product_Api.php failed, {r.status_code}, please check your WP API")
+        return self.products_exist([product_id]).get(product_id)
+
+    def products_exist(self, product_ids, batch_size=100, partial=False):
+        """
+        批量检查 product 是否存在，每批一次 product_Api.php 请求
+        :param product_ids:
+        :param batch_size:
+        :param partial: 某一批查询失败时不抛异常，这批产品标记为 EXIST_UNKNOWN
+        :return: {product_id: {'article_id': .., 'cat_ids': set()}}，不存在的不返回
+        """
+        url = self.product_api_url
+        product_ids = list(dict.fromkeys(product_ids))
+
+        if self.export:
+            # 导出模式不询问 WordPress，只和这次已经导出的比较
+            return self.export.exported(product_ids)
+
+        result = {}
+        if self.index:
+            # 本地索引里有的就不再询问 WordPress
+            result = self.index.get_many(product_ids)
+            product_ids = [x for x in product_ids if x not in result]
+
+        for i in range(0, len(product_ids), batch_size):
+            batch = product_ids[i:i + batch_size]
+            try:
+                r = self.post(url, 30, {'product_ids': ','.join(batch)})
+                if r.status_code != 200:
+                    raise Exception(f"Fetch product_Api.php failed, {r.status_code}, please check your WP API")
 
-        json_data = r.json()
-        if not json_data['exist']:
+                json_data = r.json()
+            except Exception as e:
+                if not partial:
+                    raise
+                logger.warning(f'{e}, check {len(batch)} products one by one')
+                result.update({x: EXIST_UNKNOWN for x in batch})
+                continue
+
+            if not json_data['exist']:
+                continue
+
+            for product_id, exist in json_data['exist'].items():
+                category_ids = set()
+                for c in exist['categories']:
+                    category_ids.add(c['term_id'])
+
+                result[product_id] = {'article_id': exist['article_id'], 'cat_ids': category_ids}
+                logger.warning(f'Exist, Update Product: {product_id}')
+
+                if self.index:
+                    self.index.put(product_id, exist['article_id'], category_ids)
+
+        return result
+
+    def resync_index(self, page_size=1000):
+        """从 WordPress 批量重建本地 product 索引"""
+        if not self.index:
             return
 
-        category_ids = set()
-        for c in json_data['exist']['categories']:
-            category_ids.add(c['term_id'])
+        url = self.product_api_url
+        self.index.clear()
+
+        page, total = 1, 0
+        while True:
+            r = self.post(url, 60, {'list': 1, 'page': page, 'per_page': page_size})
+            if r.status_code != 200:
+                raise Exception(f"Fetch product_Api.php failed, {r.status_code}, please check your WP API")
 
-        data = {'article_id': json_data['exist']['article_id'], 'cat_ids': category_ids}
+            json_data = r.json()
+            for product_id, exist in (json_data['exist'] or {}).items():
+                category_ids = set(c['term_id'] for c in exist['categories'])
+                self.index.put(product_id, exist['article_id'], category_ids, media_ids=exist.get('media_ids'))
+                total += 1
 
-        logger.warning(f'Exist, Update Product: {product_id}')
+            if not json_data.get('more'):
+                break
+            page += 1
 
-        return data
+        logger.info(f'Resync product index: {total} products')
 
-    def extract_category(self, r):
-        if r.text == "":
+    def extract_category(self, r, previous=None):
+        """
+        :param previous: 增量发现时上次的产品列表，只处理有变化的产品
+        :return: 分类页上全部产品的 key
+        """
+        if not r.content:
             return
 
-        soup = BeautifulSoup(r.text, 'lxml')
+        with METRICS.timer('parse_category'):
+            page = self.parser.parse_category(r.content, page_parser.response_encoding(r))
 
         # 一、二级分类
         categories = []
-        for nav in soup.select('div.nav-title > .layui-breadcrumb'):
-            nav_items = nav.select('a')
-            level1 = nav_items[1].text
-            level2 = nav_items[2].text
+        for nav in page['categories']:
+            level2 = nav['level2']
             categories.append({
-                'level1': {'name': level1},
-                'level2': {'name': level2}
+                'level1': {'name': nav['level1']},
+                'level2': {'name': nav['level2']}
             })
 
-        for sub_list in soup.select('div.boxT > .posit-box'):
+        # 先收集整页的 product id，批量查询是否已存在
+        product_ids = [p['product_id'] for g in page['groups'] for p in g['products']]
+        # 查询失败的那一批在处理产品时再单个查询，不影响整个分类
+        exists = self.products_exist(product_ids, partial=True)
+
+        listing = [self.product_key(p) for g in page['groups'] for p in g['products']]
+        if self.journal:
+            self.journal.discover(self.link, listing)
+
+        for group in page['groups']:
             # 三级分类
-            level3 = sub_list.select_one('h2 > a').text.strip()
+            level3 = group['name']
             logger.info(f"Scrape genre: {level3}")
 
             # 添加三级到分类结构体
@@ -86,65 +292,153 @@ class Scrape:
             category_ids = self.wp_cls.build_categories(categories)
 
             # product urls in this sub genre
-            for a in sub_list.select('div.hang > a'):
-                time.sleep(1)
-                try:
-                    # Only update if this product already exist
-                    exist_data = self.product_exist(a.select_one('div.Product').text)
-                    if exist_data:
-                        # union exist category with new category
-                        category_ids = category_ids.union(exist_data['cat_ids'])
-                        self.wp_cls.update_article(exist_data['article_id'], category_ids)
-                        continue
-
-                    path = a['href']
-
-                    if not path:
-                        continue
-
-                    logger.info(f'Find {path}')
-
-                    r = self.fetch(self.root + path, 30)
-
-                    if r.status_code != 200:
-                        logger.error(f"Fetch {r.url} failed, {r.status_code}")
-                        continue
-
-                    self.extract_product(category_ids, level2, r)
+            for p in group['products']:
+                posted = exists.get(p['product_id']) not in (None, EXIST_UNKNOWN)
+                if previous is not None and not self.discovery.changed(self.product_key(p), previous, posted):
+                    METRICS.count('not_modified')
+                    continue
+
+                if self.scheduler:
+                    self.scheduler.submit(self.link, self.process_product, p, category_ids, level2, exists)
+                else:
+                    self.process_product(p, category_ids, level2, exists)
+
+        return listing
+
+    def product_key(self, product):
+        """进度日志里产品的 key，优先用产品页 url"""
+        return self.root + product['href'] if product['href'] else product['product_id']
+
+    def process_product(self, product, category_ids, belongs_category, exists, attempt=0):
+        """处理分类页中的一个产品链接，可在线程池中并发运行，attempt 为重新排队的次数"""
+        key = self.product_key(product)
+        state, data = self.journal.get(self.link, key) if self.journal else (None, {})
+        if self.resume and state in checkpoint.FINISHED:
+            logger.debug(f'Checkpoint {state}, skip: {key}')
+            METRICS.count('resumed_skip')
+            return
 
-                except Exception as e:
-                    logger.error(f'Error: {e}')
-                    time.sleep(10)
+        self.bucket.acquire()
+        if not attempt:
+            METRICS.count('products')
+            self.handled.add(key)
+        try:
+            def failed(error):
+                """批量写入时发布失败要在发送后才知道，同样重新排队"""
+                self.requeue(error, product, category_ids, belongs_category, exists, attempt)
+
+            def missing(error):
+                """索引里的文章在 WordPress 里被删除了：忘掉它，马上重新查询，查不到就重新创建"""
+                exists.pop(product['product_id'], None)
+                self.requeue(error, product, category_ids, belongs_category, exists, attempt, delay=0)
+
+            # 已经抓取过产品页，直接用保存的内容发布
+            if self.resume and state in (checkpoint.FETCHED, checkpoint.MEDIA_UPLOADED):
+                logger.info(f'Resume {key} from {state}')
+                self.publish_product(key, category_ids, data['payload'], data.get('media'), failed=failed)
+                return
+
+            # Only update if this product already exist
+            product_id = product['product_id']
+            exist_data = exists.get(product_id)
+            if exist_data == EXIST_UNKNOWN or (attempt and not exist_data):
+                # 失败时抛异常，只重新排队这个产品；重试时也重新查询，上次的创建可能已经成功
+                exist_data = self.product_exist(product_id)
+            if exist_data and not self.sync:
+                # union exist category with new category
+                new_cat_ids = category_ids.union(exist_data['cat_ids'])
+                if new_cat_ids == exist_data['cat_ids']:
+                    logger.debug(f'Unchanged, skip product: {product_id}')
+                    METRICS.count('unchanged')
+                    return
+
+                def updated(ok):
+                    if ok and self.index:
+                        self.index.update_categories(product_id, new_cat_ids)
+                    if ok and self.journal:
+                        self.journal.mark(self.link, key, checkpoint.UPDATED)
+
+                self.wp_cls.update_article(exist_data['article_id'], new_cat_ids, then=updated, missing=missing)
+                return
+
+            path = product['href']
+
+            if not path:
+                return
+
+            logger.info(f'Find {path}')
+
+            # 增量发现选出来的产品是 sitemap 说有变化的，不用缓存里的旧页面
+            r = self.fetch(self.root + path, 30, revalidate=self.discovery is not None)
+
+            if r.status_code in retry_policy.RETRY_STATUS and not self.offline:
+                # 服务器暂时不可用，交给 requeue 稍后再试
+                raise Exception(f"Fetch {r.url} failed, {r.status_code}")
+
+            if r.status_code != 200:
+                logger.error(f"Fetch {r.url} failed, {r.status_code}")
+                return
+
+            self.extract_product(category_ids, belongs_category, r, key, exist_data, failed=failed, missing=missing)
+
+        except Exception as e:
+            self.requeue(e, product, category_ids, belongs_category, exists, attempt)
+
+    def requeue(self, error, product, category_ids, belongs_category, exists, attempt, delay=None):
+        """失败的产品稍后重新排队，不阻塞当前线程；host 熔断时等熔断结束，delay 为 0 时马上重新处理"""
+        key = self.product_key(product)
+        if attempt >= MAX_REQUEUE:
+            logger.error(f'Error: {error}, give up {key}')
+            METRICS.count('failed')
+            self.gave_up.add(key)
+            return
 
-    def extract_product(self, category_ids, belongs_category, r):
-        if r.text == "":
+        if delay is None and isinstance(error, retry_policy.CircuitOpenError):
+            delay = error.retry_in
+        elif delay is None:
+            delay = self.policy.backoff(attempt + 1)
+
+        logger.warning(f'Error: {error}, requeue {key} in {delay:.0f}s')
+        METRICS.count('requeued')
+
+        args = (product, category_ids, belongs_category, exists, attempt + 1)
+        if self.scheduler:
+            self.scheduler.submit_later(delay, self.link, self.process_product, *args)
+        else:
+            self.deferred.append((time.monotonic() + delay, args))
+
+    def run_deferred(self):
+        """顺序模式：分类里其他产品处理完后，按到期时间重试失败的产品"""
+        while self.deferred:
+            self.deferred.sort(key=lambda x: x[0])
+            due, args = self.deferred.pop(0)
+            time.sleep(max(due - time.monotonic(), 0))
+            self.process_product(*args)
+
+    def extract_product(self, category_ids, belongs_category, r, key=None, exist=None, failed=None, missing=None):
+        if not r.content:
             return
 
-        soup = BeautifulSoup(r.text, 'lxml')
+        with METRICS.timer('parse_product'):
+            page = self.parser.parse_product(r.content, page_parser.response_encoding(r))
 
         # product id
-        product_id = soup.select_one('cite').text
+        product_id = page['product_id']
         title = f'{product_id} Bearing'
 
-        # Category
-        # main_category = soup.select_one('div.firstbreadcrumb > span > a:nth-child(3)').text
-
         # Small img
-        small_img = soup.select_one('div.layui-col-md3.detail-img-box > img')['src']
-        small_img = self.root + small_img
+        small_img = self.root + page['small_img']
 
         # Big img
-        big_img = soup.select_one('div#magnifier img')['src']
-        big_img = self.root + big_img
+        big_img = self.root + page['big_img']
 
         # Price
-        price = soup.select_one('div.detail-img-box > div > div > span').text.replace('$ ', '')
+        price = page['price'].replace('$ ', '')
         if not re.match(r'\d+', price) or float(price) == 0:
             price = 'Negotiable'
 
         # Get table
-        table_html = str(soup.select_one('div.layui-row > div.layui-col-md4 > div.layui-col-md9 > table'))
-        table = pandas.read_html(table_html, thousands="ª", decimal="ª")[0]
+        table = page['table']
 
         # Get size
         size = self.get_size(table)
@@ -154,112 +448,187 @@ class Scrape:
 
         title = f'{title} {belongs_category} {size}'.strip()
 
-        self.wp_cls.post_article(title=title,
-                                 category_ids=category_ids,
-                                 product_id=product_id,
-                                 small_pic_url=small_img,
-                                 big_pic_url=big_img,
-                                 price=price,
-                                 table1=table1,
-                                 table2=table2,
-                                 size = size,
-                                 )
+        payload = {
+            'title': title,
+            'product_id': product_id,
+            'small_pic_url': small_img,
+            'big_pic_url': big_img,
+            'price': price,
+            'table1': table1,
+            'table2': table2,
+            'size': size,
+        }
+
+        if exist:
+            return self.sync_product(key, category_ids, payload, exist, missing=missing)
+
+        if self.journal and key:
+            self.journal.mark(self.link, key, checkpoint.FETCHED, payload=payload)
+
+        self.publish_product(key, category_ids, payload, failed=failed)
+
+    def sync_product(self, key, category_ids, payload, exist, missing=None):
+        """增量同步已存在的产品：和保存的 hash 比较，只更新变化的字段和分类，没有变化时不写 WordPress"""
+        product_id = payload['product_id']
+        hashes = product_index.field_hashes(payload)
+        old = exist.get('field_hashes') or {}
+        changed = [k for k in product_index.SYNC_FIELDS if old.get(k) != hashes[k]]
+
+        new_cat_ids = category_ids.union(exist['cat_ids'])
+        cat_changed = new_cat_ids != exist['cat_ids']
+
+        if not changed and not cat_changed:
+            logger.debug(f'Unchanged, skip product: {product_id}')
+            METRICS.count('unchanged')
+            return
+
+        logger.info(f'Sync {product_id}: {", ".join(changed + (["categories"] if cat_changed else []))}')
+
+        def synced(result):
+            """同步成功后更新本地索引和进度日志，批量写入时在发送后调用"""
+            if result is None:
+                return
+
+            applied, fields = result
+            METRICS.count('synced')
+
+            if self.index:
+                # 没更新成功的字段保留原来的 hash，下次再同步
+                hashes.update({k: old.get(k) for k in changed if k not in applied})
+                media_ids = list(exist.get('media_ids') or [None, None])
+                if 'featured_media' in fields:
+                    media_ids[0] = fields['featured_media']
+                if 'structure_pic' in fields:
+                    media_ids[1] = fields['structure_pic']
+
+                self.index.put(product_id, exist['article_id'], new_cat_ids, media_ids=media_ids,
+                               content_hash=product_index.payload_hash(hashes), hashes=hashes)
+
+            if self.journal and key:
+                self.journal.mark(self.link, key, checkpoint.UPDATED)
+
+        self.wp_cls.sync_article(exist['article_id'], payload, changed, new_cat_ids if cat_changed else None,
+                                 then=synced, missing=missing)
+
+    def publish_product(self, key, category_ids, payload, media=None, failed=None):
+        """上传图片并发布文章，进度写入日志，failed(error) 为发送后才知道的失败"""
+        progress = None
+        if self.journal and key:
+            def progress(state, **data):
+                self.journal.mark(self.link, key, state, **data)
+
+        return self.wp_cls.post_article(category_ids=category_ids, media=media, progress=progress, failed=failed,
+                                        **payload)
 
     def replace_cell(self, table, old, new):
         """替换第一列单元格的文字"""
-        try:
-            i = table[table[0] == old].index
-            table.loc[i[0], 0] = new
-        except:
-            pass
+        table.rename(old, new)
         return table
 
     def modify_table(self, table):
         """拆分 table 成两个，并返回其html"""
 
         # 删除最后一行
-        table.drop(table.tail(1).index, inplace=True)
+        table.drop_last()
 
         # 修改型号名称
-        table.loc[0, 0] = 'Bearing Model'
-        table.loc[0, 1] = f'{table.iat[0, 1]} Bearing'
+        model = table.cell(0, 1)
+        table.set(0, 0, 'Bearing Model')
+        table.set(0, 1, f'{"nan" if model is None else model} Bearing')
 
         # 修改表格属性名称
-        changes = [
-            ["System of Measurement", "Size Standards"],
-            ["Ball", "Deep Groove Ball Bearing"],
-            ["For Load Direction", "Load Direction"],
-            ["Construction", "Number of Raceway Ring Rows"],
-            ["Bore Dia", "Inner Dimension d(Ø)"],
-            ["Outer Dia", "Outer Dimension D(Ø)"],
-            ["Width", "Width B"],
-            ["Ring Material", "Inner/Outer Ring Material"],
-        ]
-        for c in changes:
+        for c in TABLE_CHANGES:
             table = self.replace_cell(table, c[0], c[1])
 
         split_num = 12
 
         # 获取前12行成一个表
         table1 = table.head(split_num)  # 获取n行之前
-        table1_html = table1.to_html(classes='table1', header=False, index=False).replace('border="1" ', '')
+        table1_html = table1.to_html(classes='table1')
 
         # 获取后面的行成一个表
         table2 = table.tail(len(table) - split_num)
-        table2_html = table2.to_html(classes='table2', header=False, index=False).replace('border="1" ', '')
+        table2_html = table2.to_html(classes='table2')
 
         return table1_html, table2_html
 
-    @retry(tries=5, delay=10, backoff=2, max_delay=120)
-    def fetch(self, url, timeout, headers=None):
+    @property
+    def offline(self):
+        return bool(self.pages and self.pages.offline)
+
+    def fetch(self, url, timeout, headers=None, revalidate=False):
         """
-        get and post
+        get and post，有页面缓存时先查缓存，过期后发条件请求
+        :param revalidate: 缓存没过期也发条件请求（sitemap 这类要看到最新内容的页面）
         """
         if not isinstance(headers, dict):
             headers = dict()
 
-        r = self.get(url, timeout, headers)
+        cached = self.pages.get(url) if self.pages else None
+        if cached and ((cached['fresh'] and not revalidate) or self.offline):
+            METRICS.count('page_cache_hit')
+            return page_cache.cached_response(url, cached['content'], encoding=cached['encoding'])
+
+        if self.offline:
+            # 离线模式下没有缓存的页面，同 Cache-Control: only-if-cached
+            logger.warning(f'Not in page cache: {url}')
+            METRICS.count('page_cache_miss')
+            return page_cache.cached_response(url, b'', 504)
+
+        if cached:
+            if cached['etag']:
+                headers['if-none-match'] = cached['etag']
+            if cached['last_modified']:
+                headers['if-modified-since'] = cached['last_modified']
+
+        r = self.policy.call('page', url, lambda: self.get(url, timeout, headers))
+
+        if r.status_code == 304 and cached:
+            METRICS.count('page_not_modified')
+            self.pages.touch(url)
+            return page_cache.cached_response(url, cached['content'], encoding=cached['encoding'])
+
+        if r.status_code == 200 and self.pages:
+            self.pages.put(url, r.content, etag=r.headers.get('etag'), last_modified=r.headers.get('last-modified'),
+                           encoding=page_parser.response_encoding(r))
+
         return r
 
+    def post(self, url, timeout, data, headers=None):
+        """
+        post form data，product_Api.php 只读查询，可以安全重试
+        """
+        if not isinstance(headers, dict):
+            headers = dict()
+
+        headers['user-agent'] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/98.0.4758.80 Safari/537.36 Edg/98.0.1108.50"
+
+        def send():
+            with self.host_limiter.slot(url):
+                return self.r.post(url=url, data=data, headers=headers, timeout=timeout, verify=False)
+
+        return self.policy.call('product_api', url, send)
+
     def get(self, url, timeout, headers):
         """
         get
         """
         headers['user-agent'] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/98.0.4758.80 Safari/537.36 Edg/98.0.1108.50"
-        return self.r.get(url=url, headers=headers, timeout=timeout, verify=False)
+        with self.host_limiter.slot(url):
+            r = self.r.get(url=url, headers=headers, timeout=timeout, verify=False)
+
+        METRICS.add_bytes('page', metrics.host_of(url), len(r.content))
+        return r
 
     def get_size(self, table):
         """
         获取 table 里面 size 的属性
         """
-        key_list = [
-            ['Bore diameter', 'Outside diameter', 'Width'],
-            ['Bore Dia', 'Outer Dia', 'Height'],
-            ['Bore Dia', 'Outer Dia', 'Width'],
-            ['Inside Diameter Of Inner Ring', 'Outside Diameter Of Outer Ring', 'Height Of Overall Bearing Assembly (H)'],
-            ['Roller OD', 'Bore Dia', 'Roller Width'],
-            ['Bore diameter (d)', 'Outside diameter (D)', 'Nominal width'],
-            ['Height M', 'Width W', 'Length L'],
-            ['Maximum length', 'Nominal rail size'],
-            ['Bore Dia', 'Outer Dia', 'Width'],
-            ['Bore Diameter', 'Outside Diameter', 'Width'],
-            ['Bore(d)', 'Cup Outer Diameter(D)', 'Bearing Width(T)'],
-            ['Shoulder diameter of inner ring', 'Permissible axial displacement', 'Diameter of shaft abutment'],
-            ['Bore', 'Outer Diameter', 'Outer Ring Width'],
-            ['b1', 'c1', 'd']
-        ]
-
-        for keys in key_list:
-            try:
-                values = []
-                for key in keys:
-                    hit = table[table[0] == key].index
-                    values.append(table.loc[hit[0], 1])
-
-                size = '×'.join(values)
-                return size
-            except:
-                pass
+        for keys in SIZE_KEYS:
+            values = [table.value(key) for key in keys]
+            # 缺少 key 或者值不是文字（整列为数字）时换下一组
+            if all(isinstance(v, str) for v in values):
+                return '×'.join(values)
 
         return ''
 
@@ -0,0 +1,200 @@
+import html
+import re
+
+import lxml.html
+
+# pandas.read_html 默认当作 NaN 的文字
+NA_VALUES = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+
+RE_WHITESPACE = re.compile(r'[\r\n]+|\s{2,}')
+# 只认 ASCII 数字，全角数字 pandas 当作文字
+RE_INT = re.compile(r'^[+-]?[0-9]+$')
+RE_FLOAT = re.compile(r'^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?$')
+RE_DECIMAL = re.compile(r'^[+-]?[0-9]+\.[0-9]*$')
+RE_INF = re.compile(r'^[+-]?inf(inity)?$', re.IGNORECASE)
+
+# pandas 当作布尔值的文字，大小写只认这三种
+TRUE_VALUES = {'True', 'TRUE', 'true'}
+FALSE_VALUES = {'False', 'FALSE', 'false'}
+
+
+def cell_text(td):
+    """与 pandas 一致：合并空白后去掉首尾空格"""
+    return RE_WHITESPACE.sub(' ', td.text_content()).strip()
+
+
+def convert_column(texts):
+    """
+    按列推断类型，与 pandas.read_html 的结果一致：
+    整列都是整数 -> int，整列都是数字（或有空值的整数）-> float，inf/Infinity 也算数字，
+    整列都是 True/False 且没有空值 -> bool，否则保留文字
+    """
+    values = [None if t is None or t in NA_VALUES else t for t in texts]
+    present = [v for v in values if v is not None]
+
+    if present and len(present) == len(values) and all(v in TRUE_VALUES or v in FALSE_VALUES for v in present):
+        return [v in TRUE_VALUES for v in values]
+
+    if present and all(RE_INT.match(v) for v in present):
+        if len(present) == len(values):
+            return [int(v) for v in values]
+        return [float(v) if v is not None else None for v in values]
+
+    if present and all(RE_FLOAT.match(v) or RE_INF.match(v) for v in present):
+        return [float(v) if v is not None else None for v in values]
+
+    return values
+
+
+def is_float_column(values):
+    """pandas 里是 float64 的列：全是小数或空值"""
+    return all(v is None or isinstance(v, float) for v in values)
+
+
+def format_float_column(values):
+    """
+    float64 列整列统一格式，与 DataFrame.to_html 一致：先都保留 6 位小数，再去掉整列共同的末尾 0；
+    有绝对值小于 1e-6 的数，或者有大于 1e6 的数且最长超过 12 个字符时，整列改用科学计数法
+    """
+    def with_spec(spec):
+        texts = ['NaN' if v is None else format(v, spec) for v in values]
+        decimals = [i for i, t in enumerate(texts) if RE_DECIMAL.match(t)]
+        while decimals and all(texts[i].endswith('0') for i in decimals):
+            for i in decimals:
+                texts[i] = texts[i][:-1]
+        for i in decimals:
+            if texts[i].endswith('.'):
+                texts[i] += '0'
+        return texts
+
+    texts = with_spec('.6f')
+    sizes = [abs(v) for v in values if v is not None]
+    too_long = max((len(t) for t in texts), default=0) > 12
+    if any(0 < v < 1e-6 for v in sizes) or (too_long and any(v > 1e6 for v in sizes)):
+        texts = with_spec('.6e')
+    return texts
+
+
+def format_value(value):
+    """单元格输出为 html 时的文字，与 DataFrame.to_html 对 object 列的格式一致"""
+    if value is None:
+        return 'NaN'
+    if isinstance(value, float):
+        text = f'{value:.6f}'.rstrip('0')
+        return text + '0' if text.endswith('.') else text
+    return html.escape(str(value), quote=False)
+
+
+class SpecTable:
+    """
+    产品参数表，按行保存 [key, value, ...]，第一列 key 可以 O(1) 查找
+    用来代替 pandas.read_html + DataFrame 的处理
+    """
+
+    def __init__(self, rows, float_columns=()):
+        self.rows = rows
+        self.keys = None
+        # pandas 里是 float64 的列，输出时整列统一格式；写入文字后变成 object 列
+        self.float_columns = set(float_columns)
+
+    @classmethod
+    def from_element(cls, table):
+        """从 lxml 的 <table> 元素建立"""
+        rows = []
+        for tr in table.iter('tr'):
+            cells = [c for c in tr if c.tag in ('td', 'th')]
+            # 表头（只有 th 的开头行）不算数据
+            if not rows and cells and all(c.tag == 'th' for c in cells):
+                continue
+
+            texts = []
+            for c in cells:
+                texts.extend([cell_text(c)] * max(int(c.get('colspan', 1) or 1), 1))
+
+            rows.append(texts)
+
+        width = max((len(r) for r in rows), default=0)
+        # 只有一列时空行是空白行，会被 pandas 丢掉；多列时补成一行 NaN
+        if width <= 1:
+            rows = [r for r in rows if r and r[0]]
+        columns = [convert_column([r[i] if i < len(r) else None for r in rows]) for i in range(width)]
+        return cls([[col[i] for col in columns] for i in range(len(rows))],
+                   [j for j, col in enumerate(columns) if is_float_column(col)])
+
+    @classmethod
+    def from_html(cls, table_html):
+        return cls.from_element(lxml.html.fragment_fromstring(table_html))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def index_of(self, key):
+        """返回第一列等于 key 的第一行下标，没有返回 None"""
+        if self.keys is None:
+            self.keys = {}
+            for i, row in enumerate(self.rows):
+                if row and isinstance(row[0], str):
+                    self.keys.setdefault(row[0], i)
+        return self.keys.get(key)
+
+    def value(self, key, column=1):
+        i = self.index_of(key)
+        if i is None:
+            return None
+        return self.rows[i][column]
+
+    def cell(self, i, j):
+        return self.rows[i][j]
+
+    def set(self, i, j, value):
+        self.rows[i][j] = value
+        if not isinstance(value, float):
+            self.float_columns.discard(j)
+        if j == 0:
+            self.keys = None
+
+    def rename(self, old, new):
+        """替换第一列的文字，只替换第一个"""
+        i = self.index_of(old)
+        if i is None:
+            return False
+
+        self.rows[i][0] = new
+        del self.keys[old]
+        for k in range(i + 1, len(self.rows)):
+            if self.rows[k][0] == old:
+                self.keys[old] = k
+                break
+
+        if new not in self.keys or self.keys[new] > i:
+            self.keys[new] = i
+        return True
+
+    def drop_last(self):
+        if self.rows:
+            self.rows.pop()
+            self.keys = None
+
+    def head(self, n):
+        return SpecTable(self.rows[:n], self.float_columns)
+
+    def tail(self, n):
+        """同 DataFrame.tail，n 为负数时去掉前 -n 行"""
+        return SpecTable(self.rows[-n:] if n else [], self.float_columns)
+
+    def to_html(self, classes):
+        """输出与 DataFrame.to_html(classes=.., header=False, index=False) 去掉 border 后相同的 html"""
+        floats = {j: format_float_column([row[j] for row in self.rows]) for j in self.float_columns}
+        lines = [f'<table class="dataframe {classes}">', '  <tbody>']
+        for i, row in enumerate(self.rows):
+            lines.append('    <tr>')
+            for j, value in enumerate(row):
+                text = floats[j][i] if j in floats else format_value(value)
+                lines.append(f'      <td>{text}</td>')
+            lines.append('    </tr>')
+        lines.append('  </tbody>')
+        lines.append('</table>')
+        return '\n'.join(lines)
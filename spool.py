@@ -0,0 +1,102 @@
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+
+# 只用标准库，main.py --enqueue 不需要导入抓取相关的模块
+
+# 任务文件先写到 tmp，再改名到 new；daemon 改名到 work 表示领取，完成后放到 done 或 failed
+DIRS = ('tmp', 'new', 'work', 'done', 'failed')
+
+
+def try_lock(path):
+    """打开文件并加非阻塞排他锁，返回 fd，文件不存在或已被锁返回 None；进程退出时锁自动释放"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+class Spool:
+    """
+    目录队列，一个任务一个 json 文件，靠 rename 保证原子性，多个进程可以同时投递和领取
+    领取的任务文件一直持有 flock，直到完成，这样能区分正在运行的任务和 daemon 退出后留下的任务
+    """
+
+    def __init__(self, path='./data/spool'):
+        self.path = path
+        # 领取中的任务 name -> 加锁的 fd
+        self.locks = {}
+        self.lock = threading.Lock()
+        for d in DIRS:
+            os.makedirs(os.path.join(path, d), exist_ok=True)
+
+    def dir(self, name):
+        return os.path.join(self.path, name)
+
+    def put(self, job):
+        """投递任务，返回任务文件名"""
+        name = f'{time.time():.6f}-{uuid.uuid4().hex[:8]}.json'
+        tmp = os.path.join(self.dir('tmp'), name)
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(job, f)
+        os.replace(tmp, os.path.join(self.dir('new'), name))
+        return name
+
+    def take(self):
+        """领取最早的任务，返回 (name, job)，没有任务返回 (None, None)"""
+        for name in sorted(os.listdir(self.dir('new'))):
+            # 先锁再改名，别的 daemon 的 recover 不会把领取中的任务放回去
+            fd = try_lock(os.path.join(self.dir('new'), name))
+            if fd is None:
+                continue
+
+            try:
+                os.rename(os.path.join(self.dir('new'), name), os.path.join(self.dir('work'), name))
+            except FileNotFoundError:
+                # 被别的 daemon 领走了
+                os.close(fd)
+                continue
+
+            with self.lock:
+                self.locks[name] = fd
+            try:
+                with open(os.path.join(self.dir('work'), name), encoding='utf-8') as f:
+                    return name, json.load(f)
+            except ValueError:
+                self.finish(name, False)
+        return None, None
+
+    def finish(self, name, ok=True):
+        os.replace(os.path.join(self.dir('work'), name), os.path.join(self.dir('done' if ok else 'failed'), name))
+        with self.lock:
+            fd = self.locks.pop(name, None)
+        if fd is not None:
+            os.close(fd)
+
+    def recover(self):
+        """退出的 daemon 没做完的任务放回队列，还被锁着的是别的 daemon 正在运行的，不动"""
+        recovered = 0
+        for name in os.listdir(self.dir('work')):
+            fd = try_lock(os.path.join(self.dir('work'), name))
+            if fd is None:
+                continue
+
+            try:
+                os.replace(os.path.join(self.dir('work'), name), os.path.join(self.dir('new'), name))
+                recovered += 1
+            finally:
+                os.close(fd)
+        return recovered
+
+    def pending(self):
+        return len(os.listdir(self.dir('new')))
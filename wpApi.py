@@ -1,11 +1,23 @@
+import hashlib
 import json
 import os
 import re
+import tempfile
 import time
+import threading
 
-import requests
 import magic
-from retry import retry
+import limiter
+import http_pool
+import product_index
+import category_cache
+import checkpoint
+import metrics
+import retry_policy
+import batch_writer
+import media_queue as media_queue_mod
+from metrics import METRICS
+from concurrent.futures import ThreadPoolExecutor
 from loguru import logger
 from requests_toolbelt.multipart.encoder import MultipartEncoder
 
@@ -13,16 +25,67 @@ main_category_id = '0'  # 主分类ID
 WP_USER_ID = 'admin'
 WP_API_KEY = 'YTEI hCbP sxpI ZEnv RQLp biR3'
 
+MEDIA_CHUNK_SIZE = 64 * 1024  # 图片传输的块大小，也是单个传输在内存中的上限
+
+IMG_HEADERS = {
+    'accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
+    'accept-encoding': 'gzip,deflate,br',
+    'accept-language': 'zh-CN,zh;q=0.9',
+    'referer': 'https://gl.ali213.net/',
+    'sec-ch-ua': '"GoogleChrome";v="95","Chromium";v="95",";NotABrand";v="99"',
+    'sec-ch-ua-mobile': '?0',
+    'sec-ch-ua-platform': '"Windows"',
+    'sec-fetch-dest': 'image',
+    'sec-fetch-mode': 'no-cors',
+    'sec-fetch-site': 'same-site',
+    'user-agent': 'Mozilla/5.0(WindowsNT10.0;Win64;x64)AppleWebKit/537.36(KHTML,likeGecko)Chrome/95.0.4638.69Safari/537.36',
+}
+
+
+class ArticleMissing(Exception):
+    """要更新的文章在 WordPress 里已经被删除"""
+
+    def __init__(self, article_id):
+        super().__init__(f'Article {article_id} not found in WordPress')
+        self.article_id = article_id
+
 
 class Api:
-    def __init__(self):
-        self.my_domain = 'https://products.com'
+    def __init__(self, host_limiter=None, media_workers=1, index=None, categories=None, pool_size=10, media=None,
+                 my_domain=None, policy=None, batch_size=0, optimizer=None, media_queue=0, media_draft=False):
+        # 连接池，WordPress 和图片源站各一个，线程间共享 keep-alive 连接
+        self.wp_http = http_pool.SessionPool(pool_size, auth=(WP_USER_ID, WP_API_KEY))
+        self.img_http = http_pool.SessionPool(pool_size, headers=IMG_HEADERS)
+
+        self.index = index
+        self.media = media  # MediaCache，None 表示不去重
+        self.categories = categories if categories is not None else category_cache.CategoryCache(None)
+        self.categories_warm = False
+        self.categories_lock = threading.Lock()
+        self.host_limiter = host_limiter or limiter.HostLimiter()
+        self.policy = policy or retry_policy.RetryPolicy()
+        # 大于1时小图和大图并行传输，所有 worker 共用，大小按 worker 数给（每个 worker 两张图片）
+        self.media_pool = ThreadPoolExecutor(max_workers=media_workers) if media_workers > 1 else None
+        # ImageOptimizer，上传前压缩图片，None 表示上传原图
+        self.optimizer = optimizer
+        # media_queue > 0 时文章先发布（media_draft 时先存草稿），图片在单独的队列里上传后再补上
+        self.media_queue = media_queue_mod.MediaQueue(self, workers=media_queue) if media_queue > 0 else None
+        self.media_draft = media_draft
+
+        self.my_domain = my_domain or 'https://products.com'
         self.post_api_url = self.my_domain + '/wp-json/wp/v2/posts'
         self.category_api_url = self.my_domain + '/wp-json/wp/v2/categories'
         self.img_api_url = self.my_domain + '/wp-json/wp/v2/media'
 
+        # batch_size > 0 时创建和更新文章通过 /batch/v1 批量发送
+        self.writer = batch_writer.BatchWriter(self.my_domain + '/wp-json', self.wp_http, self.policy,
+                                               self.host_limiter, self.post_json,
+                                               max_items=batch_size) if batch_size > 0 else None
+
     def build_categories(self, categories):
         """建立 1，2，3 级分类，并返回分类ID 的集合"""
+        self.warm_categories()
+
         level3_ids = set()
         for c in categories:
             level1_id = self.create_category(c['level1']['name'], main_category_id)
@@ -33,55 +96,236 @@ class Api:
 
         return level3_ids
 
-    def post_article(self, title, category_ids, product_id, small_pic_url, big_pic_url, price, table1, table2, size):
+    def post_article(self, title, category_ids, product_id, small_pic_url, big_pic_url, price, table1, table2, size,
+                     media=None, progress=None, failed=None):
         """
-        post article
+        post article，图片上传失败或提交出错时抛异常，由调用方重新排队
+        :param media: 已上传的图片 {'feature': (id, url), 'structure': (id, url)}，有的就不再上传
+        :param progress: 进度回调 progress(state, **data)
+        :param failed: 提交失败回调 failed(error)，批量写入时在发送后调用
         """
-        feature = self.upload_picture(small_pic_url, title)  # feature picture
-        if not feature:
-            logger.error(f'upload small pic: {small_pic_url} failed')
-            return
-
-        structure_pic = self.upload_picture(big_pic_url, title)  # big picture
-        if not structure_pic:
-            logger.error(f'upload big pic: {big_pic_url} failed')
-            return
-
-        try:
-            status = self.submit(title=title,
-                                 category_ids=category_ids,
-                                 feature_id=feature[0],
-                                 product_id=product_id,
-                                 structure_pic_id=structure_pic[0],
-                                 price=price,
-                                 table1=table1,
-                                 table2=table2,
-                                 size=size,
-                                 )
-        except Exception as e:
-            logger.error(f'Submit {title} failed: {e}')
-            return
+        if self.media_queue:
+            return self.post_first(title, category_ids, product_id, small_pic_url, big_pic_url, price, table1, table2,
+                                   size, media, progress, failed)
+
+        media = dict(media or {})
+        feature = media.get('feature') or self.upload_later(small_pic_url, title)
+        structure_pic = media.get('structure') or self.upload_later(big_pic_url, title)
+        feature, structure_pic = self.upload_result(feature), self.upload_result(structure_pic)
+
+        if feature[0]:
+            media['feature'] = list(feature)
+        if structure_pic[0]:
+            media['structure'] = list(structure_pic)
+
+        if not feature[0] or not structure_pic[0]:
+            # 已上传的图片记下来，重试时不再上传
+            if progress and media:
+                progress(None, media=media)
+            raise Exception(f'upload {"small" if not feature[0] else "big"} pic: '
+                            f'{small_pic_url if not feature[0] else big_pic_url} failed')
+
+        if progress:
+            progress(checkpoint.MEDIA_UPLOADED, media=media)
+
+        def posted(status):
+            if not status:
+                return self.submit_failed(title, failed)
+
+            METRICS.count('posted')
+
+            if progress:
+                progress(checkpoint.POSTED, article_id=status)
+
+            if self.index:
+                hashes = product_index.field_hashes({
+                    'title': title, 'price': price, 'table1': table1, 'table2': table2, 'size': size,
+                    'small_pic_url': small_pic_url, 'big_pic_url': big_pic_url,
+                })
+                self.index.put(product_id, status, category_ids,
+                               media_ids=[feature[0], structure_pic[0]],
+                               content_hash=product_index.payload_hash(hashes),
+                               hashes=hashes)
+
+            return status
+
+        return self.submit(title=title,
+                           category_ids=category_ids,
+                           feature_id=feature[0],
+                           product_id=product_id,
+                           structure_pic_id=structure_pic[0],
+                           price=price,
+                           table1=table1,
+                           table2=table2,
+                           size=size,
+                           then=posted,
+                           )
+
+    @staticmethod
+    def submit_failed(title, failed):
+        """提交没有成功，交给 failed 回调重新排队"""
+        if failed:
+            failed(Exception(f'Submit {title} failed'))
+        else:
+            METRICS.count('failed')
+        return False
 
-        return status
+    def post_first(self, title, category_ids, product_id, small_pic_url, big_pic_url, price, table1, table2, size,
+                   media=None, progress=None, failed=None):
+        """
+        不等图片，先发布文章（已上传过的图片直接带上），其余图片交给 media_queue，上传后再补到文章上
+        图片补上之前索引里不记它的 hash，最终失败时下次 --sync 会重新上传
+        """
+        media = dict(media or {})
+        feature = media.get('feature') or ('', '')
+        structure_pic = media.get('structure') or ('', '')
+
+        images = {}
+        if not feature[0]:
+            images['featured_media'] = small_pic_url
+        if not structure_pic[0]:
+            images['structure_pic'] = big_pic_url
+
+        hashes = product_index.field_hashes({
+            'title': title, 'price': price, 'table1': table1, 'table2': table2, 'size': size,
+            'small_pic_url': small_pic_url, 'big_pic_url': big_pic_url,
+        })
+        media_ids = [feature[0] or None, structure_pic[0] or None]
+
+        def remember(article_id):
+            if not self.index:
+                return
+            known = dict(hashes)
+            if not media_ids[0]:
+                known['small_pic_url'] = None
+            if not media_ids[1]:
+                known['big_pic_url'] = None
+            self.index.put(product_id, article_id, category_ids, media_ids=media_ids,
+                           content_hash=product_index.payload_hash(known), hashes=known)
+
+        def attached(article_id, uploaded):
+            if 'featured_media' in uploaded:
+                media['feature'] = list(uploaded['featured_media'])
+                media_ids[0] = uploaded['featured_media'][0]
+            if 'structure_pic' in uploaded:
+                media['structure'] = list(uploaded['structure_pic'])
+                media_ids[1] = uploaded['structure_pic'][0]
+
+            if uploaded:
+                remember(article_id)
+                if progress:
+                    progress(None, media=media)
+
+        def posted(status):
+            if not status:
+                return self.submit_failed(title, failed)
+
+            METRICS.count('posted')
+            if progress:
+                progress(checkpoint.POSTED, article_id=status)
+            remember(status)
+
+            if images:
+                self.media_queue.attach(status, images, title, publish=self.media_draft,
+                                        then=lambda uploaded: attached(status, uploaded))
+            return status
+
+        return self.submit(title=title,
+                           category_ids=category_ids,
+                           feature_id=feature[0] or 0,
+                           product_id=product_id,
+                           structure_pic_id=structure_pic[0] or '',
+                           price=price,
+                           table1=table1,
+                           table2=table2,
+                           size=size,
+                           status='draft' if images and self.media_draft else 'publish',
+                           then=posted,
+                           )
+
+    def upload_later(self, img_url, title):
+        """有图片线程池时提交上传任务，否则直接上传"""
+        if self.media_pool:
+            return self.media_pool.submit(self.upload_picture, img_url, title)
+        return self.upload_picture(img_url, title)
+
+    @staticmethod
+    def upload_result(job):
+        return job.result() if hasattr(job, 'result') else job
 
     def upload_picture(self, img_url, title):
-        """ 下载图片，然后上传到wp"""
+        """ 下载图片，然后上传到wp，相同图片复用已上传的 media"""
+        if not self.media:
+            return self.transfer_picture(img_url, title)
+
+        with self.media.url_lock(img_url):
+            return self.transfer_picture(img_url, title)
+
+    def transfer_picture(self, img_url, title):
+        """ 下载并上传一张图片，返回 (media id, source_url)"""
+        cached = self.media.lookup_url(img_url) if self.media else None
+        headers = {}
+        if cached and cached['media']:
+            if self.media.is_fresh(img_url):
+                logger.debug(f'Media cache hit: {img_url}')
+                return cached['media']
+
+            # 条件请求，源图片没变化时返回 304
+            if cached['etag']:
+                headers['if-none-match'] = cached['etag']
+            if cached['last_modified']:
+                headers['if-modified-since'] = cached['last_modified']
+
         try:
-            r_download = self.fetch(img_url)
+            r_download = self.fetch(img_url, headers)
+        except retry_policy.CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f'Download {img_url} failed: {e}')
             return "", ""
 
+        if r_download.status_code == 304 and cached and cached['media']:
+            logger.debug(f'Media not modified: {img_url}')
+            r_download.close()
+            self.media.mark_fresh(img_url)
+            return cached['media']
+
         if r_download.status_code != 200:
             logger.error(f'Download {img_url} failed: {r_download.status_code}')
+            r_download.close()
             return "", ""
 
-        file_name = f'scrape_{str(round(time.time() * 1000))}.{os.path.splitext(img_url)[-1][1:]}'
+        body, sha256, mime = r_download.spooled
+        with body:
+            return self.store_picture(img_url, title, r_download, body, sha256, mime)
+
+    def store_picture(self, img_url, title, r_download, body, sha256, mime):
+        """ 把已下载的图片上传到wp，内容已上传过的直接复用"""
+        if self.media:
+            self.media.put_url(img_url, sha256,
+                               etag=r_download.headers.get('etag'),
+                               last_modified=r_download.headers.get('last-modified'))
+
+            media = self.media.lookup_sha(sha256)
+            if media:
+                logger.debug(f'Media content hit: {img_url}')
+                return media
+
+        ext = os.path.splitext(img_url)[-1][1:]
+        if self.optimizer:
+            # 去重仍然按原图的 sha256，转换后的文件只用来上传
+            optimized = self.optimizer.process(body, mime)
+            if optimized:
+                body, mime, ext = optimized
+
+        file_name = f'scrape_{str(round(time.time() * 1000))}.{ext}'
         if "?" in file_name:
             file_name = re.search(r'(.+)\?', file_name).group(1)
 
         try:
-            r_upload = self.upload(r_download, file_name, title)
+            r_upload = self.upload(body, mime, file_name, title)
+        except retry_policy.CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f'Upload {img_url} failed: {e}')
             return "", ""
@@ -92,57 +336,119 @@ class Api:
 
         json_data = r_upload.json()
 
-        return json_data['id'], json_data['source_url']
+        if self.media:
+            self.media.put_media(sha256, json_data['id'], json_data['source_url'])
 
-    @retry(tries=6, delay=2, backoff=2)
-    def fetch(self, url):
-        header = {
-            'accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
-            'accept-encoding': 'gzip,deflate,br',
-            'accept-language': 'zh-CN,zh;q=0.9',
-            'referer': 'https://gl.ali213.net/',
-            'sec-ch-ua': '"GoogleChrome";v="95","Chromium";v="95",";NotABrand";v="99"',
-            'sec-ch-ua-mobile': '?0',
-            'sec-ch-ua-platform': '"Windows"',
-            'sec-fetch-dest': 'image',
-            'sec-fetch-mode': 'no-cors',
-            'sec-fetch-site': 'same-site',
-            'user-agent': 'Mozilla/5.0(WindowsNT10.0;Win64;x64)AppleWebKit/537.36(KHTML,likeGecko)Chrome/95.0.4638.69Safari/537.36',
-        }
+        return json_data['id'], json_data['source_url']
 
+    def fetch(self, url, headers=None):
+        """
+        下载图片，200 时在同一个并发名额里把内容读完，--per-host 才能限制到正在传输的连接
+        :return: response，r.spooled 为 spool() 的结果，不是 200 时为 None
+        """
         logger.debug(f"Fetch: {url}")
 
-        r = requests.get(url, headers=header, timeout=45, verify=False)
+        def send():
+            with self.host_limiter.slot(url):
+                r = self.img_http.get(url, headers=headers, timeout=45, stream=True)
+                r.spooled = self.spool(r) if r.status_code == 200 else None
+                return r
 
-        return r
+        return self.policy.call('image_download', url, send)
 
-    @retry(tries=8, delay=1, backoff=2)
-    def upload(self, r_download, file_name, title):
-        """上传图片到 wordpress """
+    def spool(self, r_download):
+        """按块读取下载内容到临时文件（超过一个块才落盘），同时计算 sha256 和文件类型"""
+        body = tempfile.SpooledTemporaryFile(max_size=MEDIA_CHUNK_SIZE)
+        sha256 = hashlib.sha256()
+        mime = None
+        try:
+            for chunk in r_download.iter_content(MEDIA_CHUNK_SIZE):
+                if mime is None:
+                    mime = magic.from_buffer(chunk[0:2048], mime=True)  # 找到文件类型
+                sha256.update(chunk)
+                body.write(chunk)
+                METRICS.add_bytes('image_download', metrics.host_of(r_download.url), len(chunk))
+        except Exception:
+            body.close()
+            raise
+        finally:
+            r_download.close()
+
+        return body, sha256.hexdigest(), mime or 'application/octet-stream'
+
+    def upload(self, body, mime, file_name, title):
+        """上传图片到 wordpress，multipart 从临时文件流式读取，会新建 media，不是幂等的"""
         logger.debug(f"Upload: {file_name}")
 
-        mime = magic.from_buffer(r_download.content[0:2048], mime=True)  # 找到文件类型
-        multipart_data = MultipartEncoder(
-            fields={
-                # a file upload field
-                'file': (file_name, r_download.content, mime),
-                # plain text fields
-                'title': title,
-                'alt_text': title,
-                'caption': title,
-            }
-        )
-
-        r_upload = requests.post(self.img_api_url,
-                                 data=multipart_data,
-                                 headers={'Content-Type': multipart_data.content_type},
-                                 auth=(WP_USER_ID, WP_API_KEY),
-                                 verify=False)
-        return r_upload
-
-    @retry(tries=8, delay=1, backoff=2)
-    def submit(self, title, category_ids, feature_id, product_id, structure_pic_id, price, table1, table2, size):
-        """发布文章到wp"""
+        size = body.seek(0, os.SEEK_END)
+        METRICS.add_bytes('media_upload', metrics.host_of(self.img_api_url), size)
+
+        def send():
+            body.seek(0)
+            multipart_data = MultipartEncoder(
+                fields={
+                    # a file upload field
+                    'file': (file_name, body, mime),
+                    # plain text fields
+                    'title': title,
+                    'alt_text': title,
+                    'caption': title,
+                }
+            )
+
+            with self.host_limiter.slot(self.img_api_url):
+                return self.wp_http.post(self.img_api_url,
+                                         data=multipart_data,
+                                         headers={'Content-Type': multipart_data.content_type})
+
+        return self.policy.call('media_upload', self.img_api_url, send, idempotent=False)
+
+    def post_json(self, stage, path, payload, idempotent=True):
+        """单独发送一个写请求，path 为 /wp/v2/... ，返回 (status_code, json)"""
+        url = self.my_domain + '/wp-json' + path
+        headers = {'content-type': "Application/json"}
+
+        def send():
+            with self.host_limiter.slot(url):
+                return self.wp_http.post(url, data=json.dumps(payload), headers=headers)
+
+        r = self.policy.call(stage, url, send, idempotent=idempotent)
+        try:
+            return r.status_code, r.json()
+        except ValueError:
+            return r.status_code, {}
+
+    def write(self, stage, path, payload, done, idempotent=True, key=None):
+        """
+        写请求：有 writer 时放进批次，结果稍后交给 done(status_code, json)，返回 None；
+        否则直接发送，返回 done 的结果
+        """
+        if self.writer:
+            self.writer.add(stage, path, payload, done, idempotent, key)
+            return None
+
+        return done(*self.post_json(stage, path, payload, idempotent))
+
+    def flush(self):
+        """
+        等待批量写入和图片补上全部完成
+        两者互相产生任务：批量创建的文章发送后才把图片交给 media_queue，补图片又是一次写入，
+        所以轮流等待直到都空闲
+        """
+        while True:
+            if self.writer:
+                self.writer.flush()
+            if self.media_queue:
+                self.media_queue.wait()
+            if not self.writer or self.writer.idle():
+                return
+
+    def submit(self, title, category_ids, feature_id, product_id, structure_pic_id, price, table1, table2, size,
+               status='publish', then=None):
+        """
+        发布文章到wp，成功返回文章ID，会新建文章，不是幂等的
+        :param then: 结果回调 then(文章ID 或 False)，批量写入时在发送后调用
+        """
         logger.debug(f"Submit Article: {title}")
 
         cat_ids_str = ",".join([str(x) for x in category_ids])
@@ -150,7 +456,7 @@ class Api:
         payload = {
             'title': title,
             'content': '',
-            'status': "publish",
+            'status': status,
             'author': "1",
             'categories': cat_ids_str,
             'featured_media': feature_id,
@@ -164,24 +470,67 @@ class Api:
             }
         }
 
-        headers = {'content-type': "Application/json"}
+        def done(status_code, data):
+            if status_code == 201:
+                logger.success(f'Submit success: {status_code}')
+                post_id = data['id']
+            else:
+                logger.error(f'Submit failed: {status_code}')
+                post_id = False
+            return then(post_id) if then else post_id
+
+        return self.write('submit', '/wp/v2/posts', payload, done, idempotent=False, key=product_id)
+
+    def warm_categories(self, refresh=False):
+        """启动时一次性分页拉取全部分类到缓存，本地缓存非空时跳过"""
+        with self.categories_lock:
+            if self.categories_warm and not refresh:
+                return
+
+            if refresh or not len(self.categories):
+                self.categories.clear()
+                page, pages = 1, 1
+                while page <= pages:
+                    r = self.fetch_categories(page)
+                    if r.status_code != 200:
+                        logger.error(f'Fetch categories page {page} failed: {r.status_code}')
+                        break
+
+                    for c in r.json():
+                        self.categories.put(c['name'], c['parent'], c['id'], save=False)
+
+                    pages = int(r.headers.get('X-WP-TotalPages', 1))
+                    page += 1
+
+                self.categories.save()
+                logger.info(f'Prefetch {len(self.categories)} categories')
+
+            self.categories_warm = True
+
+    def fetch_categories(self, page):
+        """分页获取分类列表"""
+        def send():
+            with self.host_limiter.slot(self.category_api_url):
+                return self.wp_http.get(self.category_api_url,
+                                        params={'per_page': 100, 'page': page, '_fields': 'id,name,parent'}
+                                        )
+
+        return self.policy.call('category_list', self.category_api_url, send)
 
-        r = requests.post(self.post_api_url,
-                          data=json.dumps(payload),
-                          headers=headers,
-                          auth=(WP_USER_ID, WP_API_KEY),
-                          verify=False
-                          )
-        if r.status_code == 201:
-            logger.success(f'Submit success: {r.status_code}')
-            return True
-        else:
-            logger.error(f'Submit failed: {r.status_code}')
-            return False
-
-    @retry(tries=5, delay=1, backoff=2)
     def create_category(self, category_name, category_parent_id):
-        """创建分类并返回分类ID，如果分类存在会返回分类ID"""
+        """创建分类并返回分类ID，先查缓存"""
+        term_id = self.categories.get(category_name, category_parent_id)
+        if term_id:
+            return term_id
+
+        term_id = self.post_category(category_name, category_parent_id)
+        if term_id:
+            self.categories.put(category_name, category_parent_id, term_id)
+
+        return term_id
+
+    def post_category(self, category_name, category_parent_id):
+        """创建分类并返回分类ID，如果分类存在会返回分类ID（所以可以安全重试）"""
         payload = {
             'name': category_name,
             'parent': category_parent_id,
@@ -192,12 +541,14 @@ class Api:
 
         headers = {'content-type': "Application/json"}
 
-        r = requests.post(self.category_api_url,
-                          data=json.dumps(payload),
-                          headers=headers,
-                          auth=(WP_USER_ID, WP_API_KEY),
-                          verify=False,
-                          )
+        def send():
+            with self.host_limiter.slot(self.category_api_url):
+                return self.wp_http.post(self.category_api_url,
+                                         data=json.dumps(payload),
+                                         headers=headers
+                                         )
+
+        r = self.policy.call('category_create', self.category_api_url, send)
         if r.status_code == 201:
             logger.debug(f'Create {category_name} success: {r.status_code}')
             return r.json()['id']
@@ -210,29 +561,72 @@ class Api:
             logger.error(f'Create {category_name} failed: {r.status_code}')
             return False
 
-    @retry(tries=8, delay=1, backoff=2)
-    def update_article(self, article_id, category_ids):
-        """更新文章分类"""
+    def sync_article(self, article_id, payload, changed, category_ids=None, then=None, missing=None):
+        """
+        只把变化的字段更新到已有文章，图片变化时重新上传
+        :param changed: 变化的字段名，见 product_index.SYNC_FIELDS
+        :param then: 结果回调 then(result)，result 为 (实际更新的字段名, 发送的字段)，更新失败为 None
+        :param missing: 文章已被删除时的回调，见 update_article
+        """
+        fields, applied = {}, []
+        for k in changed:
+            if k == 'small_pic_url' or k == 'big_pic_url':
+                media_id = self.upload_result(self.upload_later(payload[k], payload['title']))[0]
+                if not media_id:
+                    logger.error(f'Upload {payload[k]} failed, keep old picture')
+                    continue
+                fields['featured_media' if k == 'small_pic_url' else 'structure_pic'] = media_id
+            else:
+                fields[k] = payload[k]
+            applied.append(k)
+
+        def done(ok):
+            result = (applied, fields) if ok else None
+            return then(result) if then else result
+
+        if not fields and category_ids is None:
+            return done(True)
+
+        return self.update_article(article_id, category_ids, fields, then=done, missing=missing)
+
+    def update_article(self, article_id, category_ids=None, fields=None, then=None, missing=None):
+        """
+        更新文章，只发送传入的部分
+        :param category_ids: 新的分类，None 表示不修改
+        :param fields: title、status、featured_media 和 metadata 里的字段
+        :param then: 结果回调 then(True/False)，批量写入时在发送后调用
+        :param missing: 文章在 WordPress 里已被删除时代替 then 调用 missing(ArticleMissing)，本地索引里的记录会去掉
+        """
         logger.debug(f"Update Article: {article_id}")
 
-        cat_ids_str = ",".join([str(x) for x in category_ids])
-
-        payload = {
-            'categories': cat_ids_str,
-        }
-
-        headers = {'content-type': "Application/json"}
-
-        r = requests.post(f'{self.post_api_url}/{article_id}',
-                          data=json.dumps(payload),
-                          headers=headers,
-                          auth=(WP_USER_ID, WP_API_KEY),
-                          verify=False
-                          )
-        if r.status_code == 200:
-            logger.success(f'Update success: {r.status_code}')
-            return True
-        else:
-            logger.error(f'Update failed: {r.status_code}')
-            return False
+        payload = {}
+        if category_ids is not None:
+            payload['categories'] = ",".join([str(x) for x in category_ids])
+
+        metadata = dict(fields or {})
+        for k in ('title', 'status', 'featured_media'):
+            if k in metadata:
+                payload[k] = metadata.pop(k)
+        if metadata:
+            payload['metadata'] = metadata
+
+        def done(status_code, data):
+            if status_code == 404 and data.get('code') == 'rest_post_invalid_id':
+                logger.warning(f'Article {article_id} was deleted in WordPress')
+                METRICS.count('article_missing')
+                if self.index:
+                    self.index.remove_article(article_id)
+                if missing:
+                    return missing(ArticleMissing(article_id))
+
+            if status_code == 200:
+                logger.success(f'Update success: {status_code}')
+                METRICS.count('updated')
+                ok = True
+            else:
+                logger.error(f'Update failed: {status_code}')
+                ok = False
+            return then(ok) if then else ok
+
+        return self.write('update', f'/wp/v2/posts/{article_id}', payload, done, key=article_id)
 